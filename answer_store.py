@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from retrieval_cache import normalize_key
+
+# Store written by build_answer_store.py
+ANSWER_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "answer_store.sqlite3")
+
+# Precomputed answers older than this are ignored until the store is rebuilt
+ANSWER_MAX_AGE = 7 * 24 * 60 * 60
+# Bytes of the store SQLite reads through a memory map instead of read() calls
+ANSWER_STORE_MMAP = 256 * 1024 * 1024
+
+# Words that point back into the conversation ("who was his successor", "yes, continue"); a stored standalone
+# answer cannot know what they refer to
+CONTEXT_REFERENCES = {
+    "he", "she", "him", "her", "his", "hers", "it", "its", "they", "them", "their", "theirs",
+    "this", "that", "these", "those", "there", "then", "more", "else", "again", "also", "same",
+    "other", "another", "former", "latter", "earlier", "previous", "above", "continue", "yes", "ok", "okay"
+}
+
+def refers_to_context(query: str) -> bool:
+    """True when a query mentions something only the conversation so far can explain"""
+    return not CONTEXT_REFERENCES.isdisjoint(normalize_key(query).split())
+
+class AnswerStore:
+    """
+    Read-only store of answers precomputed offline, keyed by normalized query. The file is only
+    ever replaced whole, so it is opened immutable and memory-mapped, and reopened when a new
+    build replaces it.
+    """
+
+    def __init__(self, path: str = ANSWER_STORE_PATH, max_age: float = ANSWER_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._db = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _close(self):
+        """Close the open connection, if any (lock held)"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _connect(self):
+        """Open the store, reopening it when a new build has replaced the file (lock held)"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._close()
+            return None
+        if self._db is None or mtime != self._mtime:
+            self._close()
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self._db.execute(f"PRAGMA mmap_size={ANSWER_STORE_MMAP}")
+            self._mtime = mtime
+        return self._db
+
+    @staticmethod
+    def create(path: str) -> sqlite3.Connection:
+        """Create an empty store at path and return a writable connection to it"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path)
+        db.execute(
+            "CREATE TABLE answers (key TEXT PRIMARY KEY, query TEXT, answer TEXT, answered_by TEXT, built_at REAL) "
+            "WITHOUT ROWID"
+        )
+        return db
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Precomputed answer to a query, or None if there is none recent enough"""
+        key = normalize_key(query)
+        if not key:
+            return None
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT answer FROM answers WHERE key = ? AND built_at >= ?",
+                (key, time.time() - self.max_age)
+            ).fetchone()
+        return row[0] if row else None
+
+    def entries(self) -> List[Dict]:
+        """Every stored query with the stage that answered it and when"""
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return []
+            rows = db.execute("SELECT query, answered_by, built_at FROM answers ORDER BY key").fetchall()
+        return [{"query": query, "answered_by": answered_by, "built_at": built_at} for query, answered_by, built_at in rows]
+
+# Global answer store instance
+answer_store = AnswerStore()
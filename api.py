@@ -1,30 +1,118 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from pydantic import BaseModel
-from chatbot import culturally_aware_chat
+from chatbot import culturally_aware_chat, answer_lane, fast_chat_pipeline
+from lane_scheduler import Lane, LaneFullError, LaneScheduler
+from conversation_memory import ConversationMemory
+from session_store import session_store
+from typing import Optional
+import asyncio
+import uuid
 import speech_recognition as sr
 import pyttsx3
 import io
 import tempfile
 import os
 
+# Import the cache warmer if knowledge retrieval is available
+try:
+    from cache_warmer import cache_warmer
+    CACHE_WARMER_AVAILABLE = True
+except ImportError:
+    CACHE_WARMER_AVAILABLE = False
+
+# Canned and knowledge-base answers take milliseconds; model generation takes seconds and
+# gets a small pool of its own so a burst of it cannot hold up the instant answers
+FAST_LANE_WORKERS = 8
+FAST_LANE_QUEUE = 256
+SLOW_LANE_WORKERS = 2
+SLOW_LANE_QUEUE = 8
+
+# How long a chat turn waits for older turns to be summarized before saving its session; a fold
+# still running after that is saved as pending turns and finished when the session is next loaded
+SUMMARY_WAIT = 2.0  # seconds
+
+# Global chat lane scheduler instance
+chat_lanes = LaneScheduler({
+    "fast": Lane("fast", FAST_LANE_WORKERS, FAST_LANE_QUEUE),
+    "slow": Lane("slow", SLOW_LANE_WORKERS, SLOW_LANE_QUEUE)
+}, classify=answer_lane)
+
+def load_memory(session_id: Optional[str]) -> Optional[ConversationMemory]:
+    """Conversation of a session, or None without a session"""
+    if session_id is None:
+        return None
+    return ConversationMemory.from_state(session_store.load(session_id))
+
+def chat_turn(message: str, session_id: Optional[str], pipeline=None,
+              memory: Optional[ConversationMemory] = None) -> str:
+    """
+    Answer one message with the session's conversation loaded before and saved after. memory is
+    the conversation if an earlier attempt at this turn loaded it already. Nothing is saved when
+    there is no reply, e.g. when the instant stages cannot answer.
+    """
+    if session_id is None:
+        return culturally_aware_chat(message, None, pipeline)
+    if memory is None:
+        memory = load_memory(session_id)
+    reply = culturally_aware_chat(message, memory, pipeline)
+    if reply:
+        memory.add_turn(message, reply)
+        # This memory is dropped after the request, so the summary has to be in what is saved
+        memory.wait_for_summary(SUMMARY_WAIT)
+        session_store.save(session_id, memory.to_state())
+    return reply
+
+async def answer_in_lane(message: str, session_id: Optional[str] = None) -> str:
+    """
+    Answer a chat message in its lane. A fast-lane message the instant stages cannot answer moves
+    to the slow lane; a full lane is reported as 503 so clients retry instead of piling up.
+    """
+    # The fast attempt loads the conversation once and the slow lane reuses it
+    loaded = {}
+    
+    def fast_attempt():
+        loaded["memory"] = load_memory(session_id)
+        return chat_turn(message, session_id, fast_chat_pipeline, loaded["memory"])
+    
+    try:
+        if chat_lanes.classify(message) == "fast":
+            reply = await asyncio.wrap_future(chat_lanes.submit("fast", fast_attempt))
+            if reply:
+                return reply
+        return await asyncio.wrap_future(chat_lanes.submit("slow", chat_turn, message, session_id, None, loaded.get("memory")))
+    except LaneFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
 app = FastAPI(title="BintaBot API", description="Culturally-aware African chatbot with voice capabilities")
 
+@app.on_event("startup")
+def start_cache_warmer():
+    """
+    Keep popular topics cached in the background. Each worker process starts a warmer; the warm
+    lease in the retrieval cache lets only one of them run per interval.
+    """
+    if CACHE_WARMER_AVAILABLE:
+        cache_warmer.start()
+
 class ChatInput(BaseModel):
     message: str
+    # Continue a conversation; /chat starts a new one when this is missing
+    session_id: Optional[str] = None
 
 class VoiceResponse(BaseModel):
     text: str
     audio_url: str = None
 
 @app.post("/chat")
-def chat(input: ChatInput):
-    reply = culturally_aware_chat(input.message)
-    return {"response": reply}
+async def chat(input: ChatInput):
+    session_id = input.session_id or uuid.uuid4().hex
+    reply = await answer_in_lane(input.message, session_id)
+    return {"response": reply, "session_id": session_id}
 
 @app.post("/voice/chat")
 async def voice_chat(input: ChatInput):
     """Chat endpoint that returns both text and audio"""
-    reply = culturally_aware_chat(input.message)
+    reply = await answer_in_lane(input.message, input.session_id)
     
     # Generate speech for the response
     try:
@@ -87,6 +175,11 @@ async def speech_to_text(audio_file: UploadFile = File(...)):
     except Exception as e:
         return {"error": f"Error processing audio: {e}"}
 
+@app.get("/lanes")
+def lane_stats():
+    """Load on each chat lane"""
+    return chat_lanes.stats()
+
 @app.get("/")
 def read_root():
     return {
@@ -94,6 +187,7 @@ def read_root():
         "endpoints": {
             "/chat": "Text-based chat",
             "/voice/chat": "Chat with voice response",
-            "/voice/speech-to-text": "Convert audio to text"
+            "/voice/speech-to-text": "Convert audio to text",
+            "/lanes": "Load on the chat lanes"
         }
     } 
\ No newline at end of file
@@ -0,0 +1,94 @@
+import argparse
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import knowledge_retriever
+from retrieval_cache import RetrievalCache
+from transport import LiveTransport, ReplayTransport, FIXTURE_DIR, get_transport, set_transport
+
+class CountingTransport(LiveTransport):
+    """Counts the requests that reach the underlying transport, per source"""
+
+    def __init__(self, inner: LiveTransport):
+        self.inner = inner
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, source, request, live):
+        with self._lock:
+            self.calls[source] += 1
+        return self.inner.call(source, request, live)
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, int(round(percent / 100 * len(ordered))) - 1)]
+
+def run_benchmark(queries: List[str], concurrency: int = 8, rounds: int = 2) -> Dict:
+    """
+    Run get_enhanced_african_knowledge for every query, rounds times, and report latency and cache behaviour
+    """
+    counter = CountingTransport(get_transport())
+    set_transport(counter)
+    report = {"rounds": []}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(rounds):
+                counter.calls.clear()
+
+                def timed(query):
+                    start = time.monotonic()
+                    result = knowledge_retriever.get_enhanced_african_knowledge(query)
+                    return time.monotonic() - start, bool(result and not result.get('errors'))
+
+                start = time.monotonic()
+                outcomes = list(executor.map(timed, queries))
+                elapsed = time.monotonic() - start
+                latencies = [latency for latency, _ in outcomes]
+                report["rounds"].append({
+                    "requests": len(queries),
+                    "ok": sum(1 for _, ok in outcomes if ok),
+                    "throughput": round(len(queries) / elapsed, 1) if elapsed else None,
+                    "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                    "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+                    "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+                    "source_calls": dict(counter.calls)
+                })
+    finally:
+        set_transport(counter.inner)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure retrieval latency and cache behaviour against recorded responses")
+    parser.add_argument("--queries", help="File with one query per line (default: the curated topic list)")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="Directory of recorded responses")
+    parser.add_argument("--live", action="store_true", help="Use the real sources instead of replaying")
+    parser.add_argument("--latency", type=float, default=None, help="Fixed replay latency in seconds (default: as recorded)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of replayed calls that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for error injection")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=2, help="Later rounds show warm-cache behaviour")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = knowledge_retriever.get_african_topic_suggestions()
+
+    if not args.live:
+        set_transport(ReplayTransport(args.fixtures, args.latency, args.latency_scale, args.error_rate, args.seed))
+    # Start from an empty cache so the first round is cold and runs are repeatable
+    knowledge_retriever.retrieval_cache = RetrievalCache(":memory:")
+
+    for number, stats in enumerate(run_benchmark(queries, args.concurrency, args.rounds)["rounds"], 1):
+        print(f"Round {number}: {stats['ok']}/{stats['requests']} ok, {stats['throughput']} req/s, "
+              f"p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, "
+              f"source calls {stats['source_calls']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from answer_store import AnswerStore, ANSWER_STORE_PATH, refers_to_context
+from cache_warmer import QUICK_ACTION_QUERIES
+from chat_pipeline import Deadline, Pipeline
+from chatbot import chat_pipeline, chat_request
+from knowledge_retriever import get_african_topic_suggestions
+from retrieval_cache import retrieval_cache, normalize_key
+
+# Most asked user queries answered ahead of time, besides the curated topics
+TOP_QUERY_COUNT = 200
+# Offline there is no user waiting, so every stage, reflection included, gets room to run
+BUILD_DEADLINE = 120.0  # seconds
+
+def answer_queries(top_query_count: int = TOP_QUERY_COUNT) -> List[str]:
+    """
+    Quick Actions and curated topics first, then the most asked user queries, without duplicates
+    or queries that lean on the conversation ("tell me more") and have no standalone answer
+    """
+    queries = []
+    seen = set()
+    for query in QUICK_ACTION_QUERIES + get_african_topic_suggestions() + retrieval_cache.top_queries(top_query_count):
+        key = normalize_key(query)
+        if key and key not in seen and not refers_to_context(query):
+            seen.add(key)
+            queries.append(query)
+    return queries
+
+def build(queries: List[str], output: str = ANSWER_STORE_PATH, deadline: float = BUILD_DEADLINE) -> Dict:
+    """
+    Answer each query with the full chat pipeline, minus the store itself, and write the answers
+    to a new store that replaces the old one only once complete. Queries that only the fallback
+    could answer are left out.
+    """
+    stats = {"queries": len(queries), "stored": 0, "unanswered": 0, "answered_by": {}}
+    pipeline = Pipeline([stage for stage in chat_pipeline.stages if stage.name != "precomputed"],
+                        fallback=lambda request: None)
+    start = time.time()
+    temp_output = f"{output}.tmp"
+    if os.path.exists(temp_output):
+        os.remove(temp_output)
+    db = AnswerStore.create(temp_output)
+
+    try:
+        for query in queries:
+            answer, trace = pipeline.run(chat_request(query), Deadline(deadline))
+            if not answer:
+                stats["unanswered"] += 1
+                continue
+            db.execute(
+                "INSERT OR REPLACE INTO answers (key, query, answer, answered_by, built_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_key(query), query, answer, trace["answered_by"], time.time())
+            )
+            stats["stored"] += 1
+            stats["answered_by"][trace["answered_by"]] = stats["answered_by"].get(trace["answered_by"], 0) + 1
+        db.commit()
+    finally:
+        db.close()
+
+    os.replace(temp_output, output)
+    stats["seconds"] = round(time.time() - start, 1)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute BintaBot's answers to its most frequent queries")
+    parser.add_argument("--output", default=ANSWER_STORE_PATH, help="Path of the answer store to write")
+    parser.add_argument("--top", type=int, default=TOP_QUERY_COUNT, help="Most asked user queries to include")
+    parser.add_argument("--deadline", type=float, default=BUILD_DEADLINE, help="Seconds allowed per query")
+    args = parser.parse_args()
+
+    stats = build(answer_queries(args.top), args.output, args.deadline)
+    print(f"Answered {stats['stored']} of {stats['queries']} queries ({stats['unanswered']} left to the live pipeline) "
+          f"in {stats['seconds']}s -> {args.output}")
+    print(f"Answered by: {stats['answered_by']}")
+
+if __name__ == "__main__":
+    main()
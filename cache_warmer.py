@@ -0,0 +1,111 @@
+import os
+import socket
+import threading
+import time
+from typing import List
+
+from knowledge_retriever import (
+    get_african_topic_suggestions, warm_african_knowledge, revalidate_wikipedia_pages, wikipedia_breaker
+)
+from circuit_breaker import CircuitBreaker
+from retrieval_cache import retrieval_cache, normalize_key
+
+# How often the warmer runs, and how long what it warms must stay fresh
+WARM_INTERVAL = 60 * 60  # seconds
+# Pause between online lookups so warming never competes with users for the sources
+WARM_RATE_DELAY = 2.0  # seconds
+# Most asked user queries warmed on each run, besides the curated topics
+TOP_QUERY_COUNT = 25
+# Lease in the retrieval cache that lets only one process warm per interval
+WARM_LEASE = "cache_warmer"
+
+# Questions behind the app's Quick Action buttons
+QUICK_ACTION_QUERIES = [
+    "Tell me about the Mali Empire",
+    "What is Ubuntu philosophy?",
+    "Tell me about African drums"
+]
+
+class CacheWarmer:
+    """
+    Background worker that keeps curated topics and popular queries fresh in the retrieval cache.
+    Every app process (e.g. each API worker) starts one, but only the process holding the warm
+    lease for the current interval runs it.
+    """
+
+    def __init__(self, interval: float = WARM_INTERVAL, rate_delay: float = WARM_RATE_DELAY,
+                 top_query_count: int = TOP_QUERY_COUNT):
+        self.interval = interval
+        self.rate_delay = rate_delay
+        self.top_query_count = top_query_count
+        self.last_run = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def warm_queries(self) -> List[str]:
+        """Curated topics and Quick Actions first, then the most asked user queries, without duplicates"""
+        queries = []
+        seen = set()
+        for query in QUICK_ACTION_QUERIES + get_african_topic_suggestions() + retrieval_cache.top_queries(self.top_query_count):
+            key = normalize_key(query)
+            if key and key not in seen:
+                seen.add(key)
+                queries.append(query)
+        return queries
+
+    def run_once(self):
+        """
+        Warm every query that would not stay fresh until the next run, one online lookup at a time
+        """
+        start = time.time()
+        stats = {"queries": 0, "fetched": 0, "failed": 0}
+        for query in self.warm_queries():
+            if self._stop.is_set() or wikipedia_breaker.state == CircuitBreaker.OPEN:
+                # Leave the rest for the next run rather than add load to a struggling source
+                break
+            stats["queries"] += 1
+            try:
+                fetched = warm_african_knowledge(query, fresh_for=self.interval)
+            except Exception:
+                stats["failed"] += 1
+                fetched = True
+            if fetched:
+                stats["fetched"] += 1
+                self._stop.wait(self.rate_delay)
+
+        # Cached articles are checked by revision id and only downloaded again if they changed
+        if not self._stop.is_set() and wikipedia_breaker.state != CircuitBreaker.OPEN:
+            try:
+                stats["pages"] = revalidate_wikipedia_pages(within=self.interval)
+            except Exception:
+                stats["failed"] += 1
+
+        stats["seconds"] = round(time.time() - start, 1)
+        self.last_run = stats
+        return stats
+
+    def _run(self):
+        """Worker loop"""
+        # Identified after any fork, since the lease tells processes apart
+        holder = f"{socket.gethostname()}:{os.getpid()}"
+        while not self._stop.is_set():
+            if retrieval_cache.claim_lease(WARM_LEASE, holder, self.interval):
+                self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the worker thread once per process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Ask the worker to stop after its current lookup"""
+        self._stop.set()
+
+# Global cache warmer instance
+cache_warmer = CacheWarmer()
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# How many recent request traces a pipeline keeps for inspection
+TRACE_HISTORY = 200
+
+# Stages started speculatively run on their own threads
+SPECULATION_WORKERS = 8
+
+_speculation_executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+
+def _timed_run(stage: "Stage", request: Any, budget: float) -> Tuple[Optional[str], float]:
+    """Run a stage and report (answer, seconds taken)"""
+    start = time.monotonic()
+    return stage.run(request, budget), time.monotonic() - start
+
+class Deadline:
+    """
+    Point in time by which a whole request must be answered
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+class Stage:
+    """
+    One way of answering a request. run(request, budget) returns an answer, or None to let the
+    next stage try; budget is the number of seconds it may spend. cost is the least time the
+    stage needs to be worth starting, and reserve is time held back for the stages after it.
+    If speculate(request) is true the stage starts as soon as the instant (zero-cost) stages
+    before it have missed, in parallel with the slower ones, instead of waiting for them to fall
+    through.
+    """
+
+    def __init__(self, name: str, run: Callable[[Any, float], Optional[str]], cost: float = 0.0, reserve: float = 0.0,
+                 speculate: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.run = run
+        self.cost = cost
+        self.reserve = reserve
+        self.speculate = speculate
+
+class Pipeline:
+    """
+    Ordered stages sharing one deadline. Each stage gets the time left minus its reserve and is
+    skipped when that cannot cover its cost; the first answer wins and fallback(request) covers
+    the case where no stage answers in time.
+    """
+
+    def __init__(self, stages: List[Stage], fallback: Callable[[Any], str]):
+        self.stages = stages
+        self.fallback = fallback
+        self.recent_traces = deque(maxlen=TRACE_HISTORY)
+        self._lock = threading.Lock()
+
+    def run(self, request: Any, deadline: Deadline) -> Tuple[str, Dict]:
+        """
+        Answer a request and return (answer, trace). The trace names the stage that answered and
+        has the seconds each stage took, the stages skipped for lack of time, any stage errors and
+        the stages started speculatively. Of those an earlier answer made unnecessary, "cancelled"
+        never ran and "abandoned" were already running and finish in the background.
+        """
+        trace = {"answered_by": None, "timings": {}, "skipped": [], "errors": {}, "deadline": deadline.seconds,
+                 "speculated": [], "cancelled": [], "abandoned": []}
+        start = time.monotonic()
+
+        speculative = {}
+        speculation_started = False
+        answer = None
+        for index, stage in enumerate(self.stages):
+            if not speculation_started and stage.cost > 0:
+                # The instant stages have missed, so start the later stages expected to be needed
+                # anyway, letting their latency overlap the slower stages before them
+                speculation_started = True
+                for later in self.stages[index + 1:]:
+                    budget = deadline.remaining() - later.reserve
+                    if later.speculate and budget >= later.cost and budget > 0 and later.speculate(request):
+                        speculative[later.name] = _speculation_executor.submit(_timed_run, later, request, budget)
+                        trace["speculated"].append(later.name)
+            future = speculative.pop(stage.name, None)
+            budget = deadline.remaining() - stage.reserve
+            if future is None and (budget < stage.cost or budget <= 0):
+                trace["skipped"].append(stage.name)
+                continue
+            stage_start = time.monotonic()
+            try:
+                if future is not None:
+                    answer, elapsed = future.result(timeout=max(0.0, budget))
+                else:
+                    answer, elapsed = _timed_run(stage, request, budget)
+            except FutureTimeoutError:
+                future.cancel()
+                trace["errors"][stage.name] = "timed out"
+                answer, elapsed = None, time.monotonic() - stage_start
+            except Exception as e:
+                trace["errors"][stage.name] = str(e)
+                answer, elapsed = None, time.monotonic() - stage_start
+            trace["timings"][stage.name] = round(elapsed, 3)
+            if answer:
+                trace["answered_by"] = stage.name
+                break
+
+        # An earlier stage answered, so speculative work still queued is dropped; work already
+        # running cannot be interrupted and finishes in the background
+        for name, future in speculative.items():
+            trace["cancelled" if future.cancel() else "abandoned"].append(name)
+
+        if not answer:
+            answer = self.fallback(request)
+            trace["answered_by"] = "fallback"
+        trace["elapsed"] = round(time.monotonic() - start, 3)
+        with self._lock:
+            self.recent_traces.append(trace)
+        return answer, trace
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Per stage: how often it answered, was skipped, failed, started speculatively, was cancelled
+        or abandoned while running, and its mean seconds, over the recent traces
+        """
+        with self._lock:
+            traces = list(self.recent_traces)
+        stats = {}
+        for name in [stage.name for stage in self.stages] + ["fallback"]:
+            timings = [trace["timings"][name] for trace in traces if name in trace["timings"]]
+            stats[name] = {
+                "answered": sum(1 for trace in traces if trace["answered_by"] == name),
+                "skipped": sum(1 for trace in traces if name in trace["skipped"]),
+                "errors": sum(1 for trace in traces if name in trace["errors"]),
+                "speculated": sum(1 for trace in traces if name in trace["speculated"]),
+                "cancelled": sum(1 for trace in traces if name in trace["cancelled"]),
+                "abandoned": sum(1 for trace in traces if name in trace["abandoned"]),
+                "mean_seconds": round(sum(timings) / len(timings), 3) if timings else None
+            }
+        return stats
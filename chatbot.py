@@ -1,8 +1,16 @@
-from model import generate_response, get_cultural_response
-from rag_system import get_rag_response
+from model import generate_response, generate_text, get_cultural_response
+from rag_system import get_rag_response, rag_system
+from entity_index import entity_index
+from sentence_stream import dedup_text
+from generation_controls import needs_reflection
+from length_policy import length_policy
+from answer_store import answer_store, refers_to_context
+from retrieval_cache import retrieval_cache
+from intent_router import IntentRouter
+from topic_classifier import get_topic_classifier
+from chat_pipeline import Deadline, Pipeline, Stage
+from conversation_memory import ConversationMemory, render_context
 import streamlit as st
-import time
-import re
 
 # Enhanced system prompt with topic awareness
 SYSTEM_PROMPT = """You are BintaBot, a wise and culturally-grounded African assistant.
@@ -78,53 +86,177 @@ fallback_responses = {
     ]
 }
 
+# Names the Manjago people are known by
+MANJAGO_KEYWORDS = ['manjago', 'manjak', 'manjaku', 'manjack']
+
+# Intents for the short fallback responses, in priority order
+FALLBACK_INTENTS = [
+    {"intent": "greeting", "any": ["hello", "hi", "greetings", "salaam"]},
+    {"intent": "story", "any": ["story", "tale", "griot"]},
+    {"intent": "proverb", "any": ["proverb", "wisdom", "elder"]},
+    {"intent": "ubuntu", "any": ["ubuntu"]},
+    {"intent": "griot", "any": ["griot"]},
+    {"intent": "sundiata", "any": ["sundiata"]},
+    {"intent": "mali_empire", "all": [["mali"], ["empire"]]},
+    {"intent": "mansa_musa", "any": ["mansa musa"]},
+    {"intent": "manjago", "any": MANJAGO_KEYWORDS}
+]
+fallback_router = IntentRouter(FALLBACK_INTENTS)
+
 def get_fallback_response(user_input):
     """Get an appropriate fallback response based on user input"""
-    user_input_lower = user_input.lower()
+    intent = fallback_router.route(user_input)
+    if intent == "manjago":
+        return AFRICAN_FALLBACK_RESPONSES["manjago"]
+    return fallback_responses[intent or "default"][0]
+
+def _has_history(chat_history):
+    """True if a ConversationMemory or list of turns holds anything"""
+    if isinstance(chat_history, ConversationMemory):
+        return not chat_history.is_empty()
+    return bool(chat_history)
+
+def _precomputed_stage(request, budget):
+    """
+    Answer computed offline by build_answer_store.py for a frequent query. Stored answers know
+    no conversation, so a query referring back to it is left to the other stages.
+    """
+    if _has_history(request["chat_history"]) and refers_to_context(request["local_query"]):
+        return None
+    answer = answer_store.lookup(request["user_input"])
+    if answer is None and request["local_query"] != request["user_input"]:
+        answer = answer_store.lookup(request["local_query"])
+    return answer
+
+def _canned_stage(request, budget):
+    """Specific fallback responses for common topics (cleaned once at load)"""
+    intent = route_african_fallback(request["local_query"])
+    return CLEANED_AFRICAN_FALLBACK_RESPONSES[intent] if intent else None
+
+def _rag_stage(request, budget):
+    """Answer from the local cultural knowledge base if it has something relevant"""
+    local_query = request["local_query"]
+    try:
+        rag_response = get_rag_response(local_query, request["chat_history"])
+    except Exception as e:
+        request["notices"]["rag"] = [f"RAG system unavailable: {str(e)}"]
+        return None
     
-    if any(word in user_input_lower for word in ["hello", "hi", "greetings", "salaam"]):
-        return fallback_responses["greeting"][0]
-    elif any(word in user_input_lower for word in ["story", "tale", "griot"]):
-        return fallback_responses["story"][0]
-    elif any(word in user_input_lower for word in ["proverb", "wisdom", "elder"]):
-        return fallback_responses["proverb"][0]
-    elif "ubuntu" in user_input_lower:
-        return fallback_responses["ubuntu"][0]
-    elif "griot" in user_input_lower:
-        return fallback_responses["griot"][0]
-    elif "sundiata" in user_input_lower:
-        return fallback_responses["sundiata"][0]
-    elif "mali" in user_input_lower and "empire" in user_input_lower:
-        return fallback_responses["mali_empire"][0]
-    elif "mansa musa" in user_input_lower:
-        return fallback_responses["mansa_musa"][0]
-    elif any(word in user_input_lower for word in ['manjago', 'manjak', 'manjaku', 'manjack']):
-        return """Ah, let me share with you the story of the Manjago people...
+    # Check if RAG found relevant information
+    rag_is_relevant = (
+        rag_response and 
+        len(rag_response) > 50 and 
+        not any(word in rag_response.lower() for word in ["i am here to share", "what specific aspect", "help you learn"]) and
+        # Check if the response actually relates to the query
+        any(word in local_query.lower() for word in rag_response.lower()[:200])
+    )
+    return clean_response(rag_response) if rag_is_relevant else None
 
-**The Manjago People:**
-The Manjago (also known as Manjak, Manjaku, or Manjack) are an ethnic group primarily found in Guinea-Bissau, Senegal, and The Gambia. They are part of the larger Bak ethnic group and speak Manjago, a language in the Niger-Congo family.
+def _likely_local_miss(request):
+    """True when the local knowledge base shares too little with the query for RAG to answer it"""
+    return rag_system.match_scores([request["local_query"]])[0] < RAG_SPECULATION_SCORE
 
-**Cultural Traditions:**
-- **Agriculture**: Known for their rice farming and palm wine production
-- **Crafts**: Skilled in basket weaving, pottery, and traditional crafts
-- **Religion**: Traditional animist beliefs with some Christian and Muslim influences
-- **Social Structure**: Organized in extended family units with strong community bonds
+def _online_stage(request, budget):
+    """
+    Answer from online sources, waiting no longer than the budget allows. This may run on a
+    speculation thread, so failed sources are left in the request's notices for the caller to show.
+    """
+    try:
+        from knowledge_retriever import (
+            get_enhanced_african_knowledge, format_knowledge_response, retrieval_warnings, RETRIEVAL_DEADLINE
+        )
+    except ImportError:
+        # Knowledge retrieval not available, leave it to the model
+        return None
+    
+    topic = request["topic"]
+    enhanced_knowledge = get_enhanced_african_knowledge(request["user_input"], deadline=min(budget, RETRIEVAL_DEADLINE))
+    request["notices"]["online"] = retrieval_warnings(enhanced_knowledge)
+    
+    if not enhanced_knowledge or not (enhanced_knowledge.get('wikipedia') or enhanced_knowledge.get('web_results')):
+        return None
+    formatted_response = format_knowledge_response(enhanced_knowledge)
+    if not formatted_response:
+        return None
+    
+    # Add cultural warmth to the response
+    response = f"""Ah, my child, let me share with you what I have learned about {topic} from our collective knowledge...
 
-**Historical Background:**
-The Manjago people have lived in the Casamance region for centuries, maintaining their cultural identity despite colonial influences. They are known for their resilience and preservation of traditional practices.
+{formatted_response}
 
-**Modern Life:**
-Today, the Manjago continue to practice their traditional customs while adapting to modern life. Many maintain their agricultural traditions and cultural ceremonies.
+As our elders say, 'Knowledge is like a garden: if it is not cultivated, it cannot be harvested.' Let us continue to learn and grow together.
 
-As our elders say, 'Every people has their own wisdom, and every culture has its own beauty.' The Manjago people remind us of the rich diversity of African cultures and the importance of preserving traditional knowledge.
+Would you like to explore more about {topic} or learn about related aspects of African culture?"""
+    return clean_response(response)
+
+def _generation_stage(request, budget):
+    """Topic-aware model generation"""
+    return generate_response(request["user_input"], Deadline(budget))
+
+# Time budget for a whole chat turn, and the least time each stage needs to be worth starting
+CHAT_DEADLINE = 30.0  # seconds
+RAG_STAGE_COST = 0.05
+ONLINE_STAGE_COST = 1.0
+# Formatting and cleaning an online answer after the lookup returns
+ONLINE_OVERRUN = 0.5
+GENERATION_STAGE_COST = 5.0
+# Queries whose content words the knowledge base covers less than this miss RAG, so online
+# retrieval starts alongside it. Measured: questions the base covers score 1.0, while off-topic
+# ones ("capital of Peru", "coffee ceremonies in Ethiopia") stay at 0.6 or below
+RAG_SPECULATION_SCORE = 0.75
+# Reflection is a second generation, so it only runs when this much time is left
+REFLECTION_COST = 5.0
+
+# Global chat pipeline instance; online retrieval holds back enough time for the model to answer,
+# and starts speculatively when the query looks like a local miss
+chat_pipeline = Pipeline([
+    Stage("precomputed", _precomputed_stage),
+    Stage("canned", _canned_stage),
+    Stage("rag", _rag_stage, RAG_STAGE_COST),
+    Stage("online", _online_stage, ONLINE_STAGE_COST, reserve=GENERATION_STAGE_COST + ONLINE_OVERRUN,
+          speculate=_likely_local_miss),
+    Stage("generate", _generation_stage, GENERATION_STAGE_COST)
+], fallback=lambda request: get_cultural_response(request["user_input"]))
+
+# Global pipeline instance with only the instant stages; it gives None when they cannot answer
+fast_chat_pipeline = Pipeline(chat_pipeline.stages[:3], fallback=lambda request: None)
+
+def answer_lane(user_input):
+    """
+    "fast" when a precomputed or canned answer or the local knowledge base should answer the query, else "slow"
+    """
+    local_query = entity_index.resolve_query(user_input)
+    # A query that may refer back to the conversation is not answered from the store
+    precomputed = not refers_to_context(local_query) and answer_store.lookup(user_input) is not None
+    if precomputed or route_african_fallback(local_query) or \
+            not _likely_local_miss({"local_query": local_query}):
+        return "fast"
+    return "slow"
+
+def chat_request(user_input, chat_history=None):
+    """The request a chat pipeline answers"""
+    return {
+        "user_input": user_input,
+        # Resolve misspelled entity names so the local paths can answer them
+        "local_query": entity_index.resolve_query(user_input),
+        # Detect the topic for better response focus
+        "topic": detect_topic(user_input),
+        "chat_history": chat_history,
+        # Warnings per stage, shown by the caller since stages may run off the Streamlit script thread
+        "notices": {}
+    }
 
-Would you like to learn more about their traditional practices or their role in West African history?"""
-    else:
-        return fallback_responses["default"][0]
+def show_stage_notices(request, trace):
+    """Show the warnings of the stages this turn waited on; speculative work it dropped stays quiet"""
+    for stage, notices in list(request["notices"].items()):
+        if stage in trace["timings"]:
+            for notice in notices:
+                st.warning(notice)
 
-def culturally_aware_chat(user_input, chat_history=None):
+def culturally_aware_chat(user_input, chat_history=None, pipeline=None):
     """
-    Enhanced chat function with cultural warmth, RAG, and BintaBot's persona
+    Enhanced chat function with cultural warmth, RAG, and BintaBot's persona.
+    pipeline defaults to chat_pipeline; with fast_chat_pipeline the result is None when no instant stage answers.
     """
     
     # Enhanced system prompt with cultural warmth
@@ -159,64 +291,16 @@ BintaBot:"""
 
     # Generate response with enhanced topic-aware system
     try:
-        # Detect the topic for better response focus
-        topic = detect_topic(user_input)
+        request = chat_request(user_input, chat_history)
         
-        # First, try specific fallback responses for common topics
-        fallback_response = get_african_fallback_response(user_input)
-        if fallback_response:
-            response = clean_response(fallback_response)
-        else:
-            # Try RAG system for better cultural responses
-            try:
-                rag_response = get_rag_response(user_input, chat_history)
-                
-                # Check if RAG found relevant information
-                rag_is_relevant = (
-                    rag_response and 
-                    len(rag_response) > 50 and 
-                    not any(word in rag_response.lower() for word in ["i am here to share", "what specific aspect", "help you learn"]) and
-                    # Check if the response actually relates to the query
-                    any(word in user_input.lower() for word in rag_response.lower()[:200])
-                )
-                
-                if rag_is_relevant:
-                    response = clean_response(rag_response)
-                else:
-                    # Try knowledge retrieval system for online information
-                    try:
-                        from knowledge_retriever import get_enhanced_african_knowledge, format_knowledge_response
-                        
-                        with st.spinner(f"Searching for information about {topic}..."):
-                            enhanced_knowledge = get_enhanced_african_knowledge(user_input)
-                        
-                        if enhanced_knowledge and (enhanced_knowledge.get('wikipedia') or enhanced_knowledge.get('web_results')):
-                            formatted_response = format_knowledge_response(enhanced_knowledge)
-                            if formatted_response:
-                                # Add cultural warmth to the response
-                                response = f"""Ah, my child, let me share with you what I have learned about {topic} from our collective knowledge...
-
-{formatted_response}
-
-As our elders say, 'Knowledge is like a garden: if it is not cultivated, it cannot be harvested.' Let us continue to learn and grow together.
-
-Would you like to explore more about {topic} or learn about related aspects of African culture?"""
-                                response = clean_response(response)
-                            else:
-                                # Fall back to topic-aware model generation
-                                response = generate_response(user_input)
-                        else:
-                            # Fall back to topic-aware model generation
-                            response = generate_response(user_input)
-                            
-                    except ImportError:
-                        # Knowledge retrieval not available, fall back to topic-aware model generation
-                        response = generate_response(user_input)
-                    
-            except Exception as e:
-                st.warning(f"RAG system unavailable: {str(e)}")
-                # Fall back to topic-aware model generation
-                response = generate_response(user_input)
+        # Precomputed or canned answer, then RAG, then online retrieval, then the model, all within one deadline
+        with st.spinner(f"Searching for information about {request['topic']}..."):
+            response, trace = (pipeline or chat_pipeline).run(request, Deadline(CHAT_DEADLINE))
+        show_stage_notices(request, trace)
+        if response:
+            # Log every answered query, however it was answered, so the cache warmer and the
+            # answer store build see the real head of traffic
+            retrieval_cache.record_query(user_input)
         
         # Post-process to ensure cultural warmth
         if response and not response.startswith("I am BintaBot"):
@@ -326,8 +410,8 @@ def initialize_chat_session():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    if not isinstance(st.session_state.get("chat_history"), ConversationMemory):
+        st.session_state.chat_history = ConversationMemory()
     
     if "daily_proverb" not in st.session_state:
         st.session_state.daily_proverb = get_daily_proverb()
@@ -336,27 +420,14 @@ def initialize_chat_session():
         st.session_state.did_you_know = get_did_you_know_fact()
 
 def add_to_chat_history(user_input, response):
-    """Add conversation to chat history"""
-    st.session_state.chat_history.append({
-        "user": user_input,
-        "bintabot": response,
-        "timestamp": time.time()
-    })
-    
-    # Keep only last 10 conversations to manage memory
-    if len(st.session_state.chat_history) > 10:
-        st.session_state.chat_history = st.session_state.chat_history[-10:]
+    """Add conversation to the session memory, which stays within a fixed token budget"""
+    if not isinstance(st.session_state.get("chat_history"), ConversationMemory):
+        st.session_state.chat_history = ConversationMemory()
+    st.session_state.chat_history.add_turn(user_input, response)
 
-def get_african_fallback_response(query):
-    """
-    Provide specific fallback responses for common African topics
-    """
-    query_lower = query.lower()
-    topic = detect_topic(query)
-    
-    # Slavery and its causes
-    if any(word in query_lower for word in ['slavery', 'slave', 'enslavement', 'what led to slavery']):
-        return """Ah, my child, this is a painful chapter in our history that we must remember and learn from...
+# Canned answers for common African topics, selected by AFRICAN_FALLBACK_INTENTS
+AFRICAN_FALLBACK_RESPONSES = {
+    "slavery": """Ah, my child, this is a painful chapter in our history that we must remember and learn from...
 
 The transatlantic slave trade, which lasted from the 15th to the 19th centuries, was driven by several factors:
 
@@ -390,11 +461,9 @@ Despite these horrors, African people showed incredible resilience. Many resiste
 
 As our elders say, 'A people without knowledge of their past history, origin, and culture is like a tree without roots.' We must remember this history to honor those who suffered and ensure such injustices never happen again.
 
-Would you like to learn more about African resistance movements or the cultural impact of the slave trade?"""
+Would you like to learn more about African resistance movements or the cultural impact of the slave trade?""",
 
-    # African spirituality and religion
-    elif topic == "religion" or any(word in query_lower for word in ['spiritual', 'spirituality', 'belief', 'faith']):
-        return """Ah, let me share with you the rich spiritual traditions of Africa...
+    "spirituality": """Ah, let me share with you the rich spiritual traditions of Africa...
 
 **Traditional African Spirituality:**
 African spirituality is deeply rooted in the belief that all things are connected - the living, the dead, and the natural world. It emphasizes harmony with nature and respect for ancestors.
@@ -423,11 +492,9 @@ In African spirituality, elders are seen as bridges between the living and the a
 
 As our elders say, 'The spirit of the ancestors lives in the wisdom of the elders.' This respect for age and experience is central to African spiritual and cultural values.
 
-Would you like to learn about specific spiritual practices or how African spirituality influences modern life?"""
+Would you like to learn about specific spiritual practices or how African spirituality influences modern life?""",
 
-    # African music and dance
-    elif topic == "music" or any(word in query_lower for word in ['music', 'dance', 'rhythm', 'drum']):
-        return """Ah, let me share with you the heartbeat of Africa through music and dance...
+    "music": """Ah, let me share with you the heartbeat of Africa through music and dance...
 
 **The Power of African Music:**
 Music in Africa is not just entertainment - it's a way of life, a form of communication, and a bridge between the physical and spiritual worlds.
@@ -463,11 +530,9 @@ Music and dance serve many purposes:
 
 As our elders say, 'When the drum speaks, the heart listens.' Music and dance continue to be powerful forces in African culture, connecting past and present, young and old.
 
-Would you like to learn about specific musical traditions or how African music has influenced global culture?"""
+Would you like to learn about specific musical traditions or how African music has influenced global culture?""",
 
-    # African family and respect for elders
-    elif topic == "family" or any(word in query_lower for word in ['elder', 'elders', 'family', 'respect']):
-        return """Ah, let me share with you the sacred bond of family and the wisdom of our elders...
+    "family": """Ah, let me share with you the sacred bond of family and the wisdom of our elders...
 
 **The African Family:**
 In African cultures, family extends far beyond parents and children. It includes grandparents, aunts, uncles, cousins, and even close family friends. This extended family system provides support, guidance, and a sense of belonging.
@@ -504,11 +569,9 @@ While urbanization and modern life have changed some family structures, the core
 
 As our elders say, 'A child who has washed their hands can dine with kings.' This proverb teaches that respect, wisdom, and proper behavior open doors to great opportunities.
 
-Would you like to learn about specific family traditions or how African family values influence modern life?"""
+Would you like to learn about specific family traditions or how African family values influence modern life?""",
 
-    # African culture and traditions
-    elif topic == "culture" or any(word in query_lower for word in ['culture', 'traditions', 'customs']):
-        return """Ah, let me share with you the rich tapestry of African cultures and traditions...
+    "culture": """Ah, let me share with you the rich tapestry of African cultures and traditions...
 
 **Diversity of African Cultures:**
 Africa is home to over 3,000 distinct ethnic groups, each with unique traditions, languages, and customs. From the Berbers of North Africa to the Zulu of South Africa, from the Yoruba of West Africa to the Maasai of East Africa, our continent is a mosaic of vibrant cultures.
@@ -537,11 +600,9 @@ Today, African cultures continue to thrive and adapt:
 
 As our elders say, 'Culture is the widening of the mind and of the spirit.' Our traditions teach us wisdom, connect us to our ancestors, and guide us toward a better future.
 
-Would you like to learn about specific cultural practices from particular regions or ethnic groups?"""
+Would you like to learn about specific cultural practices from particular regions or ethnic groups?""",
 
-    # African history
-    elif topic == "history" or any(word in query_lower for word in ['history', 'historical']):
-        return """Ah, let me share with you the magnificent story of Africa's rich history...
+    "history": """Ah, let me share with you the magnificent story of Africa's rich history...
 
 **Ancient African Civilizations:**
 Africa is the cradle of humanity and home to some of the world's oldest civilizations:
@@ -581,11 +642,9 @@ Africa is the cradle of humanity and home to some of the world's oldest civiliza
 
 As our elders say, 'The past is a guide to the future.' Understanding our history helps us build a stronger, more united Africa.
 
-Would you like to learn about specific periods, empires, or historical figures?"""
+Would you like to learn about specific periods, empires, or historical figures?""",
 
-    # Specific ethnic groups and tribes
-    elif any(word in query_lower for word in ['manjago', 'manjak', 'manjaku', 'manjack']):
-        return """Ah, let me share with you the story of the Manjago people...
+    "manjago": """Ah, let me share with you the story of the Manjago people...
 
 **The Manjago People:**
 The Manjago (also known as Manjak, Manjaku, or Manjack) are an ethnic group primarily found in Guinea-Bissau, Senegal, and The Gambia. They are part of the larger Bak ethnic group and speak Manjago, a language in the Niger-Congo family.
@@ -604,11 +663,9 @@ Today, the Manjago continue to practice their traditional customs while adapting
 
 As our elders say, 'Every people has their own wisdom, and every culture has its own beauty.' The Manjago people remind us of the rich diversity of African cultures and the importance of preserving traditional knowledge.
 
-Would you like to learn more about their traditional practices or their role in West African history?"""
+Would you like to learn more about their traditional practices or their role in West African history?""",
 
-    # General tribe/ethnic group queries
-    elif topic == "tribe" or any(word in query_lower for word in ['tribe', 'ethnic', 'people', 'group']):
-        return """Ah, let me share with you about the rich diversity of African ethnic groups...
+    "tribe": """Ah, let me share with you about the rich diversity of African ethnic groups...
 
 **The Diversity of African Peoples:**
 Africa is home to over 3,000 distinct ethnic groups, each with unique languages, traditions, and cultural practices. From the Berbers of North Africa to the Zulu of South Africa, from the Yoruba of West Africa to the Maasai of East Africa, our continent is a beautiful mosaic of cultures.
@@ -630,8 +687,36 @@ While many ethnic groups maintain their traditional practices, they also adapt t
 As our elders say, 'Unity in diversity is our strength.' Each ethnic group contributes to the rich tapestry of African culture and heritage.
 
 Would you like to learn about a specific ethnic group or their traditional practices?"""
+}
+
+# Intents for the canned answers, in priority order; a detected topic selects its intent directly
+AFRICAN_FALLBACK_INTENTS = [
+    {"intent": "slavery", "any": ['slavery', 'slave', 'enslavement', 'what led to slavery']},
+    {"intent": "spirituality", "topics": ["religion"], "any": ['spiritual', 'spirituality', 'belief', 'faith']},
+    {"intent": "music", "topics": ["music"], "any": ['music', 'dance', 'rhythm', 'drum']},
+    {"intent": "family", "topics": ["family"], "any": ['elder', 'elders', 'family', 'respect']},
+    {"intent": "culture", "topics": ["culture"], "any": ['culture', 'traditions', 'customs']},
+    {"intent": "history", "topics": ["history"], "any": ['history', 'historical']},
+    {"intent": "manjago", "any": MANJAGO_KEYWORDS},
+    {"intent": "tribe", "topics": ["tribe"], "any": ['tribe', 'ethnic', 'people', 'group']}
+]
+african_fallback_router = IntentRouter(AFRICAN_FALLBACK_INTENTS)
+
+# Classifier confidence needed before a topic alone selects a canned answer
+ROUTING_CONFIDENCE = 0.75
+
+def route_african_fallback(query, topic=None):
+    """
+    Name of the canned answer for a query, or None
+    """
+    return african_fallback_router.route(query, topic or routing_topic(query))
 
-    return None
+def get_african_fallback_response(query):
+    """
+    Provide specific fallback responses for common African topics
+    """
+    intent = route_african_fallback(query)
+    return AFRICAN_FALLBACK_RESPONSES[intent] if intent else None
 
 def clean_response(response):
     """
@@ -639,60 +724,34 @@ def clean_response(response):
     """
     if not response:
         return response
-    
-    # Split into sentences while preserving punctuation
-    sentences = re.split(r'(?<=[.!?]) +', response.strip())
-    
-    # Remove exact duplicates while preserving order
-    seen = set()
-    unique_sentences = []
-    
-    for sentence in sentences:
-        sentence_clean = sentence.strip()
-        if sentence_clean and sentence_clean.lower() not in seen:
-            seen.add(sentence_clean.lower())
-            unique_sentences.append(sentence_clean)
-    
-    # Join sentences back together
-    cleaned_response = " ".join(unique_sentences)
-    
-    # Fix any double spaces or formatting issues
-    cleaned_response = re.sub(r'\s+', ' ', cleaned_response)
-    
-    return cleaned_response.strip()
+    return dedup_text(response)
+
+# Canned answers are cleaned once here instead of on every request
+CLEANED_AFRICAN_FALLBACK_RESPONSES = {
+    intent: clean_response(response) for intent, response in AFRICAN_FALLBACK_RESPONSES.items()
+}
 
-def format_chat_history_for_context(chat_history, max_messages=4):
+def format_chat_history_for_context(chat_history):
     """
-    Format recent chat history for context to prevent repetition
+    Format chat history for context: a summary of older turns plus the recent ones, within a fixed token budget
     """
-    if not chat_history or len(chat_history) < 2:
+    if not chat_history:
         return ""
     
     try:
-        # Get the last few exchanges
-        recent_history = chat_history[-max_messages:]
-        
-        context_parts = []
-        for i in range(0, len(recent_history), 2):
-            if i + 1 < len(recent_history):
-                user_msg = recent_history[i]
-                bot_msg = recent_history[i + 1]
-                # Safely truncate bot message
-                bot_preview = str(bot_msg)[:100] + "..." if len(str(bot_msg)) > 100 else str(bot_msg)
-                context_parts.append(f"User: {user_msg}\nAssistant: {bot_preview}")
-        
-        if context_parts:
-            return "\n\nRecent conversation:\n" + "\n".join(context_parts) + "\n\n"
-        
-        return ""
+        if isinstance(chat_history, ConversationMemory):
+            return chat_history.context()
+        # A plain list of turns, as kept before conversation memory
+        return render_context("", [turn for turn in chat_history if isinstance(turn, dict) and "user" in turn])
         
     except Exception as e:
         st.warning(f"Could not format chat history: {str(e)}")
         return ""
 
-def reflect_and_improve_response(raw_response, query, topic):
+def reflect_and_improve_response(raw_response, query, topic, budget=None):
     """
-    Review and improve the response to ensure quality and relevance
+    Review and improve the response to ensure quality and relevance, within the length budget
+    of the original answer
     """
     if not raw_response or len(raw_response) < 20:
         return raw_response
@@ -722,14 +781,20 @@ def reflect_and_improve_response(raw_response, query, topic):
 **Improved Answer:**"""
     
     try:
-        improved_response = model.generate(reflection_prompt, max_length=len(raw_response) + 100, temperature=0.3, do_sample=True)
+        budget = budget or length_policy.predict(query, topic)
+        improved_response = generate_text(reflection_prompt, **budget.generate_kwargs(), temperature=0.3, do_sample=True)
+        if not improved_response:
+            return clean_response(raw_response)
         return clean_response(improved_response.strip())
     except Exception as e:
         # If reflection fails, return the original cleaned response
         return clean_response(raw_response)
 
-def generate_response(prompt):
-    """Generate response using the loaded model with topic awareness"""
+def generate_response(prompt, deadline=None):
+    """
+    Generate response using the loaded model with topic awareness. Reflection is skipped when
+    the deadline leaves too little time for it.
+    """
     try:
         # Detect the topic
         topic = detect_topic(prompt)
@@ -750,15 +815,26 @@ def generate_response(prompt):
 
 **Response:**"""
         
-        # Generate initial response
-        raw_response = model.generate(focused_prompt, max_length=300, temperature=0.7, do_sample=True)
+        # Generate initial response; decoding itself is steered away from repetition, and the
+        # length budget fits the kind of question
+        budget = length_policy.predict(prompt, topic)
+        raw_response = generate_text(
+            focused_prompt,
+            **budget.generate_kwargs(),
+            on_generated=lambda tokens: length_policy.record(budget, tokens),
+            temperature=0.7,
+            do_sample=True
+        )
+        if not raw_response:
+            # No generative model loaded
+            return get_cultural_response(prompt)
         
         # Clean and deduplicate the response
         cleaned_response = clean_response(raw_response)
         
-        # If response is too short or generic, try reflection
-        if len(cleaned_response) < 50:
-            improved_response = reflect_and_improve_response(cleaned_response, prompt, topic)
+        # Only a short or low-quality answer is worth a second generation
+        if needs_reflection(cleaned_response) and (deadline is None or deadline.remaining() >= REFLECTION_COST):
+            improved_response = reflect_and_improve_response(cleaned_response, prompt, topic, budget)
             return improved_response
         
         return cleaned_response
@@ -771,49 +847,24 @@ def detect_topic(query):
     """
     Classify the topic of a user query to focus the response
     """
-    query_lower = query.lower()
-    
-    # Topic detection based on keywords
-    topic_keywords = {
-        "music": ["music", "song", "dance", "rhythm", "drum", "instrument", "melody", "beat", "mbalax", "afrobeat", "highlife"],
-        "history": ["history", "historical", "ancient", "empire", "kingdom", "dynasty", "century", "period", "past", "traditional"],
-        "culture": ["culture", "cultural", "tradition", "custom", "ceremony", "ritual", "festival", "celebration", "heritage"],
-        "language": ["language", "linguistic", "speak", "tongue", "dialect", "word", "proverb", "saying", "expression"],
-        "tribe": ["tribe", "ethnic", "people", "group", "community", "clan", "family", "lineage", "ancestry"],
-        "religion": ["religion", "spiritual", "belief", "faith", "god", "ancestor", "sacred", "divine", "worship", "prayer"],
-        "geography": ["country", "region", "land", "place", "location", "area", "territory", "border", "coast", "river"],
-        "politics": ["government", "leader", "president", "king", "queen", "chief", "ruler", "politics", "power", "authority"],
-        "education": ["learn", "teach", "school", "education", "knowledge", "wisdom", "study", "university", "academic"],
-        "philosophy": ["philosophy", "thought", "idea", "concept", "principle", "value", "belief", "wisdom", "understanding"],
-        "food": ["food", "cuisine", "dish", "meal", "cooking", "recipe", "ingredient", "spice", "flavor", "taste"],
-        "art": ["art", "craft", "sculpture", "painting", "design", "pattern", "beadwork", "textile", "pottery"],
-        "family": ["family", "elder", "parent", "child", "grandparent", "ancestor", "relative", "kinship", "respect"],
-        "trade": ["trade", "commerce", "market", "business", "economy", "wealth", "gold", "salt", "exchange"],
-        "medicine": ["medicine", "healing", "health", "traditional", "herb", "cure", "treatment", "wellness"]
-    }
-    
-    # Count keyword matches for each topic
-    topic_scores = {}
-    for topic, keywords in topic_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in query_lower)
-        if score > 0:
-            topic_scores[topic] = score
-    
-    # Return the topic with the highest score, or "general" if no clear topic
-    if topic_scores:
-        return max(topic_scores, key=topic_scores.get)
-    else:
-        return "general"
+    return get_topic_classifier().predict(query)[0]
+
+def routing_topic(query):
+    """
+    Topic of a query when the classifier is sure enough to pick a canned answer, else None.
+    Queries naming a known person, place or people are left to retrieval.
+    """
+    topic, confidence = get_topic_classifier().predict(query)
+    if confidence < ROUTING_CONFIDENCE or entity_index.lookup(query):
+        return None
+    return topic
 
 def create_focused_prompt(query, topic, chat_history=None):
     """
     Create a topic-focused prompt for better response generation
     """
-    # Add context from recent chat history
-    context = ""
-    if chat_history and len(chat_history) > 2:
-        recent = chat_history[-2:]
-        context = f"\nRecent context: {recent[0]} → {recent[1][:100]}...\n"
+    # Add context from the conversation so far
+    context = format_chat_history_for_context(chat_history)
     
     # Create topic-specific instructions
     topic_instructions = {
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+
+# Consecutive failed or slow calls that open the circuit
+FAILURE_THRESHOLD = 3
+# A call slower than this counts as a failure even if it succeeds
+SLOW_CALL_SECONDS = 4.0
+# How long an open circuit fails fast before letting one probe through
+RESET_TIMEOUT = 30.0
+
+# Hedged requests fire after the p95 latency of recent calls, once enough calls were seen
+LATENCY_WINDOW = 100
+MIN_HEDGE_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.2  # seconds
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose circuit is open"""
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker. After repeated errors or slow responses the circuit opens
+    and calls fail immediately; after RESET_TIMEOUT a single probe decides whether to close it.
+    Idempotent sources may also hedge: a second identical call races the first when it runs long.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 slow_call_seconds: float = SLOW_CALL_SECONDS, reset_timeout: float = RESET_TIMEOUT,
+                 hedge: bool = False):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _acquire(self) -> bool:
+        """Decide whether a call may go through, returning True if it is the half-open probe"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def _record(self, ok: bool, elapsed: float, is_probe: bool):
+        """Update the circuit with the outcome of a call"""
+        with self._lock:
+            if is_probe:
+                self._probing = False
+            if ok:
+                self._latencies.append(elapsed)
+            if ok and elapsed <= self.slow_call_seconds:
+                self._failures = 0
+                self._state = self.CLOSED
+                return
+            self._failures += 1
+            if is_probe or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 latency of recent successful calls, or None until there are enough of them"""
+        with self._lock:
+            if len(self._latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return max(latencies[int(len(latencies) * 0.95) - 1], MIN_HEDGE_DELAY)
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Call fn through the breaker, raising CircuitOpenError without calling it while open
+        """
+        is_probe = self._acquire()
+        start = time.monotonic()
+        try:
+            delay = self.hedge_delay() if self.hedge and not is_probe else None
+            if delay is None:
+                result = fn(*args, **kwargs)
+            else:
+                result = self._hedged(delay, fn, args, kwargs)
+        except Exception:
+            self._record(False, time.monotonic() - start, is_probe)
+            raise
+        self._record(True, time.monotonic() - start, is_probe)
+        return result
+
+    def _hedged(self, delay: float, fn: Callable, args, kwargs) -> Any:
+        """Start fn, start it again if it has not finished after delay, and return the first success"""
+        pending = {_hedge_executor.submit(fn, *args, **kwargs)}
+        done, _ = wait(pending, timeout=delay)
+        if not done:
+            pending.add(_hedge_executor.submit(fn, *args, **kwargs))
+
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower call is abandoned and finishes in the background
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Conversation context in a prompt never exceeds this many tokens, of which the summary of
+# older turns takes at most SUMMARY_TOKEN_BUDGET; the rest holds the most recent turns verbatim
+MEMORY_TOKEN_BUDGET = 400
+SUMMARY_TOKEN_BUDGET = 120
+
+# Folding older turns into the summary happens off the request path
+SUMMARY_WORKERS = 2
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "and", "or", "to", "is", "are", "was", "were", "about", "me",
+    "tell", "what", "who", "how", "why", "when", "where", "do", "does", "did", "you", "i", "my", "your"
+}
+
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="memory-summary")
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate token count (words and punctuation marks), close enough for budgeting without the model tokenizer
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Shorten text to at most max_tokens tokens, the last one an ellipsis if anything was cut"""
+    if max_tokens <= 0:
+        return ""
+    matches = list(_TOKEN_PATTERN.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    if max_tokens == 1:
+        return "…"
+    return text[:matches[max_tokens - 2].end()] + "…"
+
+def _stems(text: str) -> set:
+    """Four-letter prefixes of the words of text, so that drums matches drum"""
+    return {word[:4] for word in re.findall(r"\w+", text.lower()) if word not in _STOPWORDS}
+
+def _key_sentence(question: str, answer: str) -> str:
+    """Sentence of the answer sharing the most words with the question, the first one on ties"""
+    question_stems = _stems(question)
+    best, best_overlap = "", -1
+    for sentence in _SENTENCE_PATTERN.split(" ".join(answer.split())):
+        overlap = len(question_stems & _stems(sentence))
+        if overlap > best_overlap and len(sentence) > 20:
+            best, best_overlap = sentence, overlap
+    return best
+
+def extractive_summary(summary: str, turns: List[Dict], max_tokens: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Add one line per turn (the question and the answer's key sentence) to a summary, dropping
+    its oldest lines once it grows past max_tokens
+    """
+    lines = [line for line in summary.split("\n") if line]
+    for turn in turns:
+        sentence = _key_sentence(turn["user"], turn["bintabot"])
+        line = f"- Asked: {truncate_tokens(turn['user'], 25)}"
+        if sentence:
+            line += f" Answer: {truncate_tokens(sentence, 35)}"
+        lines.append(line)
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+def _render_turn(turn: Dict) -> str:
+    return f"User: {turn['user']}\nBintaBot: {turn['bintabot']}"
+
+def render_context(summary: str, turns: List[Dict], token_budget: int = MEMORY_TOKEN_BUDGET) -> str:
+    """
+    Prompt text for a summary and recent turns within token_budget: the newest turns that fit
+    are kept whole and the newest one is shortened if it alone is too long
+    """
+    parts = []
+    used = 0
+    if summary:
+        summary_text = f"Earlier in this conversation:\n{summary}"
+        used = count_tokens(summary_text)
+        parts.append(summary_text)
+
+    recent_header = "Recent conversation:"
+    used += count_tokens(recent_header)
+    recent = []
+    for turn in reversed(turns):
+        text = _render_turn(turn)
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            if not recent:
+                recent.append(truncate_tokens(text, token_budget - used))
+            break
+        recent.append(text)
+        used += tokens
+    if recent:
+        parts.append(recent_header + "\n" + "\n".join(reversed(recent)))
+    return "\n\n" + "\n\n".join(parts) + "\n\n" if parts else ""
+
+class ConversationMemory:
+    """
+    Memory of one conversation within a fixed token budget. The latest turns are kept verbatim;
+    when they outgrow their share, the oldest are folded into a rolling summary in the background
+    by summarize(summary, turns) -> new summary.
+    """
+
+    def __init__(self, token_budget: int = MEMORY_TOKEN_BUDGET, summary_budget: int = SUMMARY_TOKEN_BUDGET,
+                 summarize: Optional[Callable[[str, List[Dict]], str]] = None):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.summarize = summarize or (lambda summary, turns: extractive_summary(summary, turns, summary_budget))
+        self.summary = ""
+        self.turns: List[Dict] = []
+        self._unfolded: List[Dict] = []
+        # Turns the summarizer is working on; they count as unfolded until their fold commits
+        self._in_flight: List[Dict] = []
+        self._folding = False
+        # Bumped by clear() so a fold that was running then does not write its summary back
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._folded = threading.Condition(self._lock)
+
+    def add_turn(self, user_input: str, response: str):
+        """Remember an exchange, scheduling older turns for summarization if the recent ones no longer fit"""
+        with self._lock:
+            self.turns.append({"user": user_input, "bintabot": response or "", "timestamp": time.time()})
+            recent_budget = self.token_budget - self.summary_budget
+            while len(self.turns) > 1 and sum(count_tokens(_render_turn(turn)) for turn in self.turns) > recent_budget:
+                self._unfolded.append(self.turns.pop(0))
+            if self._unfolded and not self._folding:
+                self._folding = True
+                _summary_executor.submit(self._fold)
+
+    def _fold(self):
+        """Fold turns that left the recent window into the summary until none are left"""
+        while True:
+            with self._lock:
+                turns, self._unfolded = self._unfolded, []
+                self._in_flight = turns
+                summary, generation = self.summary, self._generation
+                if not turns:
+                    self._folding = False
+                    self._folded.notify_all()
+                    return
+            try:
+                summary = self.summarize(summary, turns)
+            except Exception:
+                # Fall back to the extractive summary rather than lose these turns
+                summary = extractive_summary(summary, turns, self.summary_budget)
+            with self._lock:
+                if generation == self._generation:
+                    self.summary = truncate_tokens(summary, self.summary_budget)
+                self._in_flight = []
+
+    def context(self) -> str:
+        """Conversation context for a prompt, never longer than the token budget"""
+        with self._lock:
+            summary, turns = self.summary, self._in_flight + self._unfolded + self.turns
+        return render_context(summary, turns, self.token_budget)
+
+    def is_empty(self) -> bool:
+        """True while nothing has been said in this conversation"""
+        with self._lock:
+            return not (self.summary or self.turns or self._unfolded or self._in_flight)
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no fold is pending; False if it is still running after timeout seconds"""
+        with self._folded:
+            return self._folded.wait_for(lambda: not self._folding, timeout)
+
+    def to_state(self) -> Dict:
+        """JSON-serializable state, including turns still waiting for or being summarized"""
+        with self._lock:
+            return {"summary": self.summary, "turns": list(self.turns), "unfolded": self._in_flight + self._unfolded}
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict], **kwargs) -> "ConversationMemory":
+        """Memory restored from to_state(); turns left unsummarized are folded in the background"""
+        memory = cls(**kwargs)
+        if state:
+            memory.summary = state.get("summary", "")
+            memory.turns = list(state.get("turns", []))
+            memory._unfolded = list(state.get("unfolded", []))
+            if memory._unfolded:
+                memory._folding = True
+                _summary_executor.submit(memory._fold)
+        return memory
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self._unfolded = []
+            self._in_flight = []
+            self._generation += 1
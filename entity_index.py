@@ -0,0 +1,132 @@
+from typing import List, Dict, Set
+from collections import defaultdict
+import re
+from model import CULTURAL_KNOWLEDGE
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Knowledge base sections whose entries are named entities
+ENTITY_CATEGORIES = ["historical_figures", "ethnic_groups", "countries", "empires"]
+
+# Minimum Dice similarity between trigram sets for a fuzzy match
+MIN_SIMILARITY = 0.65
+
+def _words(text: str) -> List[str]:
+    """Lowercase words used for trigram extraction"""
+    return _WORD_PATTERN.findall(text.lower())
+
+def _trigrams(words: List[str]) -> Set[str]:
+    """Character trigrams of each word, padded so word starts and ends carry weight"""
+    grams = set()
+    for word in words:
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+def _canonical_name(category: str, key: str, info: Dict) -> str:
+    """Display name of an entity without parenthesised alternatives"""
+    if "name" in info:
+        return re.sub(r"\s*\(.*?\)", "", info["name"])
+    if category == "empires":
+        return f"{key.title()} Empire"
+    return key.replace("_", " ").title()
+
+def _entity_aliases(category: str, key: str, info: Dict) -> List[str]:
+    """Collect the surface names an entity may be referred to by"""
+    aliases = [key.replace("_", " ")]
+    if "name" in info:
+        aliases.append(_canonical_name(category, key, info))
+        # "Mandinka (Mandingo)" is known by both names
+        aliases.extend(re.findall(r"\((.*?)\)", info["name"]))
+    if category == "historical_figures":
+        # People are often named by a single part of their name ("Sundiata", "Jawara")
+        aliases.extend(word for word in _words(info["name"]) if len(word) > 3)
+    return aliases
+
+class EntityTrigramIndex:
+    """
+    Character-trigram index over the named entities in the cultural knowledge base
+    """
+
+    def __init__(self):
+        self.aliases = []
+        self._alias_trigrams = []
+        self._postings = defaultdict(list)
+        self._max_alias_words = 1
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Index every entity alias by its character trigrams
+        """
+        seen = set()
+        for category in ENTITY_CATEGORIES:
+            for key, info in CULTURAL_KNOWLEDGE[category].items():
+                name = _canonical_name(category, key, info)
+                for alias in _entity_aliases(category, key, info):
+                    words = _words(alias)
+                    if not words or (key, " ".join(words)) in seen:
+                        continue
+                    seen.add((key, " ".join(words)))
+
+                    alias_id = len(self.aliases)
+                    grams = _trigrams(words)
+                    self.aliases.append({
+                        "entity": key,
+                        "category": category,
+                        "name": name,
+                        "alias": " ".join(words)
+                    })
+                    self._alias_trigrams.append(len(grams))
+                    for gram in grams:
+                        self._postings[gram].append(alias_id)
+                    self._max_alias_words = max(self._max_alias_words, len(words))
+
+    def lookup(self, text: str, min_similarity: float = MIN_SIMILARITY) -> List[Dict]:
+        """
+        Find the entities mentioned in text, tolerating misspellings
+        """
+        words = _words(text)
+        best = {}
+
+        for start in range(len(words)):
+            for length in range(1, self._max_alias_words + 1):
+                if start + length > len(words):
+                    break
+                span_words = words[start:start + length]
+                grams = _trigrams(span_words)
+
+                # Count shared trigrams only for aliases that share at least one
+                shared = defaultdict(int)
+                for gram in grams:
+                    for alias_id in self._postings.get(gram, ()):
+                        shared[alias_id] += 1
+
+                for alias_id, count in shared.items():
+                    similarity = 2 * count / (len(grams) + self._alias_trigrams[alias_id])
+                    if similarity < min_similarity:
+                        continue
+                    alias = self.aliases[alias_id]
+                    current = best.get(alias["entity"])
+                    # Prefer the span covering more of the name, then the closer spelling
+                    if current is None or (count, similarity) > (current["shared"], current["score"]):
+                        best[alias["entity"]] = dict(alias, score=similarity, shared=count, span=" ".join(span_words))
+
+        return sorted(best.values(), key=lambda match: match["score"], reverse=True)
+
+    def resolve_query(self, query: str) -> str:
+        """
+        Append the canonical names of misspelled entities so keyword matching can find them
+        """
+        query_text = f" {' '.join(_words(query))} "
+        corrections = [
+            match["name"] for match in self.lookup(query)
+            if match["span"] != match["alias"] and f" {' '.join(_words(match['name']))} " not in query_text
+        ]
+        if not corrections:
+            return query
+        return f"{query} ({', '.join(corrections)})"
+
+# Global entity index instance
+entity_index = EntityTrigramIndex()
@@ -0,0 +1,104 @@
+from typing import Dict, List, Iterator, Set
+from collections import deque
+
+# Use the C implementation of Aho-Corasick when it is installed
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that finds every keyword of every group in one pass over a text
+    """
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        # Each keyword maps to the groups it belongs to
+        self._groups = {}
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                keyword_groups = self._groups.setdefault(keyword.lower(), [])
+                if group not in keyword_groups:
+                    keyword_groups.append(group)
+
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self._groups:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        """
+        Build the goto, failure and output tables of the pure-Python automaton
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword in self._groups:
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            self._output[node].append(keyword)
+
+        # Breadth-first so every failure target is finished before its dependants
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _iter_keywords(self, text: str) -> Iterator[str]:
+        """
+        Yield each keyword occurrence in text, overlapping occurrences included
+        """
+        if not self._groups:
+            return
+        if AHOCORASICK_AVAILABLE:
+            for _, keyword in self._automaton.iter(text):
+                yield keyword
+            return
+
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                yield from output[node]
+
+    def scan(self, text: str) -> Dict[str, Dict[str, int]]:
+        """
+        Count keyword hits in text, grouped as {group: {keyword: occurrences}}
+        """
+        hits = {}
+        for keyword in self._iter_keywords(text.lower()):
+            for group in self._groups[keyword]:
+                group_hits = hits.setdefault(group, {})
+                group_hits[keyword] = group_hits.get(keyword, 0) + 1
+        return hits
+
+    def matched_groups(self, text: str) -> Set[str]:
+        """
+        Groups with at least one keyword in text
+        """
+        groups = set()
+        for keyword in self._iter_keywords(text.lower()):
+            groups.update(self._groups[keyword])
+        return groups
@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Dict, Optional
+from sentence_stream import SentenceDeduplicator
+
+try:
+    from transformers import StoppingCriteria, StoppingCriteriaList
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    StoppingCriteria = object
+    TRANSFORMERS_AVAILABLE = False
+
+# Decode-time repetition controls, each overridable through the environment
+NO_REPEAT_NGRAM_SIZE = int(os.environ.get("BINTABOT_NO_REPEAT_NGRAM_SIZE", "4"))
+REPETITION_PENALTY = float(os.environ.get("BINTABOT_REPETITION_PENALTY", "1.15"))
+# Generation stops once this many sentences have repeated an earlier one
+MAX_REPEATED_SENTENCES = int(os.environ.get("BINTABOT_MAX_REPEATED_SENTENCES", "1"))
+# A question only ends an answer once the answer has this many sentences
+QUESTION_STOP_MIN_SENTENCES = 2
+
+# Answers shorter than this, or scoring below MIN_QUALITY, get a reflection pass
+MIN_ANSWER_CHARS = 50
+MIN_QUALITY = 0.5
+# Length at which an answer stops being penalized for being short
+GOOD_ANSWER_CHARS = 200
+
+_WORD_PATTERN = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)|\n")
+
+def decode_settings(**overrides) -> Dict:
+    """Keyword arguments for model.generate that discourage repetition while decoding"""
+    settings = {}
+    if NO_REPEAT_NGRAM_SIZE > 0:
+        settings["no_repeat_ngram_size"] = NO_REPEAT_NGRAM_SIZE
+    if REPETITION_PENALTY != 1.0:
+        settings["repetition_penalty"] = REPETITION_PENALTY
+    settings.update(overrides)
+    return settings
+
+class SentenceStoppingCriteria(StoppingCriteria):
+    """
+    Stops generation once the answer starts repeating whole sentences, once it has
+    max_sentences complete sentences, or, with stop_at_question, once it asks the follow-up
+    question that closes an answer. Only the text generated after the prompt is considered.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, max_repeats: int = MAX_REPEATED_SENTENCES,
+                 max_sentences: Optional[int] = None, stop_at_question: bool = False):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.max_repeats = max_repeats
+        self.max_sentences = max_sentences
+        self.stop_at_question = stop_at_question
+        self._sentences = SentenceDeduplicator()
+        self._emitted = 0
+        # Tokens before _read_offset have been fed; those from _prefix_offset on give the context
+        # the next tokens are decoded in, so spacing and multi-token characters come out right
+        self._prefix_offset = prompt_length
+        self._read_offset = prompt_length
+        self.stopped = False
+
+    def _new_text(self, input_ids) -> str:
+        """Text of the tokens generated since the last call, decoding only a short window"""
+        ids = input_ids[0]
+        prefix_text = self.tokenizer.decode(ids[self._prefix_offset:self._read_offset], skip_special_tokens=True)
+        text = self.tokenizer.decode(ids[self._prefix_offset:], skip_special_tokens=True)
+        # Wait while the last token is only part of a character
+        if len(text) <= len(prefix_text) or text.endswith("\ufffd"):
+            return ""
+        self._prefix_offset, self._read_offset = self._read_offset, len(ids)
+        return text[len(prefix_text):]
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        sentences = self._sentences.feed(self._new_text(input_ids))
+        self._emitted += len(sentences)
+        if self.max_repeats and self._sentences.repeats >= self.max_repeats:
+            self.stopped = True
+        elif self.max_sentences and self._emitted >= self.max_sentences:
+            self.stopped = True
+        elif self.stop_at_question and self._emitted >= QUESTION_STOP_MIN_SENTENCES:
+            self.stopped = any(sentence.endswith("?") for sentence in sentences)
+        return self.stopped
+
+    def finished_text(self, text: str) -> str:
+        """Generated text without the sentence that was cut off when this criterion stopped it"""
+        if not self.stopped:
+            return text
+        ends = list(_SENTENCE_END.finditer(text))
+        return text[:ends[-1].end()] if ends else text
+
+def stopping_criteria(tokenizer, prompt_length: int, max_sentences: Optional[int] = None,
+                      stop_at_question: bool = False):
+    """Stopping criteria for model.generate, or None without transformers"""
+    if not TRANSFORMERS_AVAILABLE:
+        return None
+    return StoppingCriteriaList([
+        SentenceStoppingCriteria(tokenizer, prompt_length, max_sentences=max_sentences, stop_at_question=stop_at_question)
+    ])
+
+def response_quality(text: str) -> float:
+    """
+    Cheap 0-1 score of a generated answer: long enough, not repeating itself, and finished
+    rather than cut off mid-sentence
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return 0.0
+    length = min(1.0, len(text) / GOOD_ANSWER_CHARS)
+    trigrams = list(zip(words, words[1:], words[2:]))
+    variety = len(set(trigrams)) / len(trigrams) if trigrams else 1.0
+    finished = 1.0 if text.rstrip().endswith((".", "!", "?", '"', "'", ")")) else 0.8
+    return length * variety * finished
+
+def needs_reflection(text: str) -> bool:
+    """True when an answer is poor enough to be worth a second generation"""
+    return len(text) < MIN_ANSWER_CHARS or response_quality(text) < MIN_QUALITY
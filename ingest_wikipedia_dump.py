@@ -0,0 +1,195 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List
+
+from knowledge_retriever import is_african_relevant, scan_african_indicators
+from offline_corpus import OfflineCorpus, OFFLINE_CORPUS_PATH
+from near_duplicates import NearDuplicateIndex
+
+# Target size of a stored chunk, in characters
+CHUNK_CHARS = 800
+
+# Pages are committed in batches to keep the ingest fast
+COMMIT_EVERY = 500
+# Chunk fingerprints remembered for deduplication (about 30 MB); repeats are mostly close together
+# in a dump, and older chunks are forgotten rather than letting memory grow with the whole dump
+DEDUP_WINDOW = 100_000
+
+_TEMPLATE_PATTERN = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE_PATTERN = re.compile(r"\{\|.*?\|\}", re.DOTALL)
+_REF_PATTERN = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_FILE_LINK_PATTERN = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINK_PATTERN = re.compile(r"\[\[(?:[^\]|]*\|)?([^\]]*)\]\]")
+_EXTERNAL_LINK_PATTERN = re.compile(r"\[https?://\S+\s*([^\]]*)\]")
+_HEADING_PATTERN = re.compile(r"^=+\s*(.*?)\s*=+\s*$", re.MULTILINE)
+_EMPHASIS_PATTERN = re.compile(r"'{2,}")
+
+def strip_wikitext(text: str) -> str:
+    """
+    Reduce wikitext markup to plain text
+    """
+    text = _REF_PATTERN.sub("", text)
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
+    # Templates nest, so remove the innermost ones until none are left
+    previous = None
+    while previous != text:
+        previous = text
+        text = _TEMPLATE_PATTERN.sub("", text)
+    text = _TABLE_PATTERN.sub("", text)
+    text = _FILE_LINK_PATTERN.sub("", text)
+    text = _LINK_PATTERN.sub(r"\1", text)
+    text = _EXTERNAL_LINK_PATTERN.sub(r"\1", text)
+    text = _HEADING_PATTERN.sub(r"\1", text)
+    text = _EMPHASIS_PATTERN.sub("", text)
+    text = _TAG_PATTERN.sub("", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """
+    Split plain text into chunks of whole sentences of about max_chars
+    """
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n"):
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph.strip()):
+            if not sentence:
+                continue
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _open_dump(path: str):
+    """Open a plain, gzip or bzip2 compressed dump for streaming"""
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def _iter_xml_pages(stream) -> Iterator[Dict]:
+    """
+    Stream article pages from a MediaWiki XML export, freeing each page once read
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end" or elem.tag.rsplit("}", 1)[-1] != "page":
+            continue
+
+        fields = {child.tag.rsplit("}", 1)[-1]: child for child in elem.iter()}
+        is_article = fields.get("ns") is None or fields["ns"].text == "0"
+        if is_article and "redirect" not in fields and fields.get("text") is not None:
+            yield {
+                "title": fields["title"].text or "",
+                "text": strip_wikitext(fields["text"].text or "")
+            }
+
+        # Drop the finished page so memory stays constant
+        elem.clear()
+        root.clear()
+
+def _iter_json_pages(stream) -> Iterator[Dict]:
+    """
+    Stream pages from a JSON lines file of {"title", "text"} objects (plain text, e.g. API extracts)
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        page = json.loads(line)
+        text = page.get("text") or page.get("extract") or page.get("content") or ""
+        yield {"title": page.get("title", ""), "text": text}
+
+def iter_dump_pages(path: str) -> Iterator[Dict]:
+    """
+    Stream {title, text} pages from an XML dump or a JSON lines subset file
+    """
+    base = re.sub(r"\.(bz2|gz)$", "", path)
+    with _open_dump(path) as stream:
+        if base.endswith((".json", ".jsonl")):
+            yield from _iter_json_pages(stream)
+        else:
+            yield from _iter_xml_pages(stream)
+
+def is_relevant_page(title: str, text: str) -> bool:
+    """
+    Keep pages whose introduction passes is_african_relevant and names an African country or region
+    """
+    intro = text[:1000]
+    return is_african_relevant(intro, title) and 'african_region' in scan_african_indicators(f"{title} {intro}")
+
+def ingest(path: str, output: str = OFFLINE_CORPUS_PATH, limit: int = None) -> Dict:
+    """
+    Build the offline corpus from a dump. The new store replaces the old one only once complete.
+    """
+    stats = {"pages_read": 0, "pages_kept": 0, "chunks": 0, "duplicate_chunks": 0}
+    # Chunks repeated across pages (mirrored articles, boilerplate sections) are stored once
+    seen_chunks = NearDuplicateIndex(max_size=DEDUP_WINDOW)
+    start = time.time()
+    temp_output = f"{output}.tmp"
+    if os.path.exists(temp_output):
+        os.remove(temp_output)
+    db = OfflineCorpus.create(temp_output)
+
+    try:
+        for page in iter_dump_pages(path):
+            if limit and stats["pages_read"] >= limit:
+                break
+            stats["pages_read"] += 1
+            if not page["title"] or not is_relevant_page(page["title"], page["text"]):
+                continue
+
+            url = f"https://en.wikipedia.org/wiki/{page['title'].replace(' ', '_')}"
+            chunks = []
+            for chunk in chunk_text(page["text"]):
+                if seen_chunks.add(chunk):
+                    chunks.append(chunk)
+                else:
+                    stats["duplicate_chunks"] += 1
+            if not chunks:
+                continue
+            db.executemany(
+                "INSERT INTO chunks (title, content, url, chunk) VALUES (?, ?, ?, ?)",
+                [(page["title"], chunk, url, index) for index, chunk in enumerate(chunks)]
+            )
+            stats["pages_kept"] += 1
+            stats["chunks"] += len(chunks)
+            if stats["pages_kept"] % COMMIT_EVERY == 0:
+                db.commit()
+
+        db.execute("INSERT INTO chunks(chunks) VALUES ('optimize')")
+        db.commit()
+    finally:
+        db.close()
+
+    os.replace(temp_output, output)
+    stats["seconds"] = round(time.time() - start, 1)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Build BintaBot's offline Wikipedia store from a dump")
+    parser.add_argument("dump", help="MediaWiki XML dump (.xml, .xml.bz2, .xml.gz) or JSON lines file (.jsonl)")
+    parser.add_argument("--output", default=OFFLINE_CORPUS_PATH, help="Path of the offline store to write")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after reading this many pages")
+    args = parser.parse_args()
+
+    stats = ingest(args.dump, args.output, args.limit)
+    print(f"Read {stats['pages_read']} pages, kept {stats['pages_kept']} African pages "
+          f"as {stats['chunks']} chunks ({stats['duplicate_chunks']} duplicates skipped) "
+          f"in {stats['seconds']}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
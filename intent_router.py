@@ -0,0 +1,44 @@
+from typing import Dict, List, Optional
+from gazetteer import KeywordAutomaton
+
+class IntentRouter:
+    """
+    Ordered intent table compiled into one keyword automaton. Each intent is a dict with
+    "intent" and either "any" (one of these substrings) or "all" (one substring from each list),
+    plus optional "topics" that select it directly. The first intent that matches wins.
+    """
+
+    def __init__(self, intents: List[Dict]):
+        groups = {}
+        self._intents = []
+        # Which intent each keyword group belongs to, and the first intent each topic selects
+        self._group_intent = {}
+        self._topic_intent = {}
+        for index, spec in enumerate(intents):
+            clauses = [spec["any"]] if "any" in spec else spec.get("all", [])
+            clause_groups = []
+            for clause_index, keywords in enumerate(clauses):
+                group = f"{index}:{clause_index}"
+                groups[group] = keywords
+                clause_groups.append(group)
+                self._group_intent[group] = index
+            for topic in spec.get("topics", ()):
+                self._topic_intent.setdefault(topic, index)
+            self._intents.append((spec["intent"], clause_groups, frozenset(spec.get("topics", ()))))
+        self.intent_names = [spec["intent"] for spec in intents]
+        self._automaton = KeywordAutomaton(groups)
+
+    def route(self, query: str, topic: Optional[str] = None) -> Optional[str]:
+        """
+        Resolve the intent of a query in one pass over it, or None if no intent matches
+        """
+        hits = self._automaton.matched_groups(query)
+        # Only intents with a keyword hit, or selected by the topic, can match
+        candidates = {self._group_intent[group] for group in hits}
+        if topic in self._topic_intent:
+            candidates.add(self._topic_intent[topic])
+        for index in sorted(candidates):
+            intent, clause_groups, topics = self._intents[index]
+            if topic in topics or all(group in hits for group in clause_groups):
+                return intent
+        return None
@@ -1,62 +1,416 @@
 import requests
-import wikipedia
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from duckduckgo_search import DDGS
 from bs4 import BeautifulSoup
 import streamlit as st
 import re
 import time
-from typing import Dict, List, Optional
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Callable
+from gazetteer import KeywordAutomaton
+from retrieval_cache import retrieval_cache, normalize_key
+from single_flight import SingleFlight
+from circuit_breaker import CircuitBreaker
+from transport import get_transport
+from near_duplicates import NearDuplicateIndex, SHORT_TEXT_MAX_DISTANCE
+from offline_corpus import offline_corpus
 
-# Configure Wikipedia for African content
-wikipedia.set_lang("en")
+# English Wikipedia for African content
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+
+# A whole online lookup shares one deadline
+RETRIEVAL_DEADLINE = 8.0  # seconds
+
+# HTTP connection pool shared by every outbound request in this module
+HTTP_POOL_SIZE = 10
+HTTP_USER_AGENT = "BintaBot/1.0 (African cultural assistant)"
+# At most one retry, and timeouts short enough that both attempts running into them (7 s; urllib3
+# does not back off before a first retry) still end within RETRIEVAL_DEADLINE, so a worker is free
+# again by the time its lookup gives up on it
+HTTP_TIMEOUT = (1.5, 2.0)  # (connect, read) seconds
+HTTP_RETRIES = Retry(
+    total=1,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"]
+)
+
+# The adapter owns the keep-alive connections and is safe to share between threads;
+# sessions are kept per thread because requests.Session itself is not thread-safe
+_http_adapter = HTTPAdapter(
+    pool_connections=HTTP_POOL_SIZE,
+    pool_maxsize=HTTP_POOL_SIZE,
+    pool_block=True,
+    max_retries=HTTP_RETRIES
+)
+_thread_local = threading.local()
+
+def get_http_session() -> requests.Session:
+    """Get this thread's HTTP session backed by the shared connection pool"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update({"User-Agent": HTTP_USER_AGENT})
+        session.mount("https://", _http_adapter)
+        session.mount("http://", _http_adapter)
+        _thread_local.session = session
+    return session
+
+# Each source fails fast while it is down; Wikipedia API reads are idempotent, so they may be hedged
+wikipedia_breaker = CircuitBreaker("Wikipedia", hedge=True)
+ddg_breaker = CircuitBreaker("DuckDuckGo")
+
+def _wikipedia_get(params: Dict, timeout) -> Dict:
+    """Single GET against the Wikipedia API, through the configured transport (live, record or replay)"""
+    def live():
+        response = get_http_session().get(WIKIPEDIA_API_URL, params={"format": "json", **params}, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    return get_transport().call("wikipedia", params, live)
+
+def wikipedia_api_request(params: Dict, timeout=HTTP_TIMEOUT) -> Dict:
+    """Call the Wikipedia API over the pooled session and return the decoded JSON"""
+    return wikipedia_breaker.call(_wikipedia_get, params, timeout)
+
+def search_wikipedia_titles(query: str, max_results: int = 3) -> List[str]:
+    """Search Wikipedia and return the matching page titles"""
+    data = wikipedia_api_request({
+        "action": "query",
+        "list": "search",
+        "srsearch": query,
+        "srlimit": max_results,
+        "srprop": ""
+    })
+    return [item["title"] for item in data.get("query", {}).get("search", [])]
+
+def fetch_wikipedia_page(title: str) -> Optional[Dict]:
+    """Fetch the plain-text content of a Wikipedia page, skipping missing and disambiguation pages"""
+    data = wikipedia_api_request({
+        "action": "query",
+        "prop": "extracts|info|pageprops",
+        "explaintext": 1,
+        "inprop": "url",
+        "ppprop": "disambiguation",
+        "redirects": 1,
+        "titles": title
+    })
+    for page in data.get("query", {}).get("pages", {}).values():
+        if "missing" in page or "disambiguation" in page.get("pageprops", {}):
+            return None
+        return {
+            "title": page["title"],
+            "content": page.get("extract", ""),
+            "url": page.get("fullurl", ""),
+            "revid": page.get("lastrevid"),
+            "touched": page.get("touched")
+        }
+    return None
+
+# Titles per revision-only query (the API limit for normal clients)
+REVISION_BATCH_SIZE = 50
+
+def fetch_wikipedia_revisions(titles: List[str]) -> Dict[str, Optional[int]]:
+    """
+    Latest revision id of each title, without downloading any content. Missing pages map to None.
+    """
+    revisions = {}
+    for start in range(0, len(titles), REVISION_BATCH_SIZE):
+        batch = titles[start:start + REVISION_BATCH_SIZE]
+        data = wikipedia_api_request({
+            "action": "query",
+            "prop": "info",
+            "titles": "|".join(batch)
+        })
+        pages = {page["title"]: page for page in data.get("query", {}).get("pages", {}).values() if "title" in page}
+        for title in batch:
+            page = pages.get(title)
+            revisions[title] = page.get("lastrevid") if page and "missing" not in page else None
+    return revisions
+
+def _revalidate_wikipedia_page(title: str) -> Optional[Dict]:
+    """Reuse the cached copy of a page if its revision is unchanged, otherwise download it again"""
+    cached = retrieval_cache.get('wikipedia_page', title)
+    if cached is not None and cached[0].get("revid"):
+        page = cached[0]
+        if fetch_wikipedia_revisions([page["title"]]).get(page["title"]) == page["revid"]:
+            return page
+    return fetch_wikipedia_page(title)
+
+def get_wikipedia_page(title: str) -> Optional[Dict]:
+    """
+    Full plain-text page through the retrieval cache. Stale copies are revalidated by revision id.
+    """
+    return retrieval_cache.get_or_fetch('wikipedia_page', title, lambda: _revalidate_wikipedia_page(title))
+
+def revalidate_wikipedia_pages(within: float = 0) -> Dict:
+    """
+    Revalidate every cached page that is stale or will be within the next within seconds,
+    checking all their revisions in bulk and re-downloading only the pages that changed
+    """
+    stats = {"checked": 0, "unchanged": 0, "refetched": 0}
+    expiring = [(key, page) for key, page in retrieval_cache.expiring('wikipedia_page', within) if page]
+    if not expiring:
+        return stats
+    
+    revisions = fetch_wikipedia_revisions(list({page["title"] for _, page in expiring}))
+    for key, page in expiring:
+        stats["checked"] += 1
+        if page.get("revid") and revisions.get(page["title"]) == page["revid"]:
+            retrieval_cache.set('wikipedia_page', key, page)
+            stats["unchanged"] += 1
+        else:
+            retrieval_cache.refresh('wikipedia_page', key, lambda: fetch_wikipedia_page(page["title"]))
+            stats["refetched"] += 1
+    return stats
+
+# Intro extracts are capped so relevance checks never download whole articles
+EXTRACT_MAX_CHARS = 1000
+EXTRACT_BATCH_SIZE = 20  # the API returns at most 20 intro extracts per request
+
+def fetch_wikipedia_extracts(titles: List[str], max_chars: int = EXTRACT_MAX_CHARS) -> Dict[str, Dict]:
+    """
+    Fetch capped plain-text intro extracts for many titles in as few requests as possible.
+    Returns {requested title: page}, leaving out missing and disambiguation pages.
+    """
+    extracts = {}
+    for start in range(0, len(titles), EXTRACT_BATCH_SIZE):
+        batch = titles[start:start + EXTRACT_BATCH_SIZE]
+        data = wikipedia_api_request({
+            "action": "query",
+            "prop": "extracts|info|pageprops",
+            "exintro": 1,
+            "explaintext": 1,
+            "exchars": max_chars,
+            "exlimit": "max",
+            "inprop": "url",
+            "ppprop": "disambiguation",
+            "redirects": 1,
+            "titles": "|".join(batch)
+        })
+        query = data.get("query", {})
+        
+        # Follow title normalization and redirects back to the requested titles
+        resolved = {title: title for title in batch}
+        for mapping in query.get("normalized", []) + query.get("redirects", []):
+            for title, target in resolved.items():
+                if target == mapping["from"]:
+                    resolved[title] = mapping["to"]
+        
+        pages = {page["title"]: page for page in query.get("pages", {}).values() if "title" in page}
+        for title, target in resolved.items():
+            page = pages.get(target)
+            if not page or "missing" in page or "disambiguation" in page.get("pageprops", {}):
+                continue
+            extracts[title] = {
+                "title": page["title"],
+                "content": page.get("extract", ""),
+                "url": page.get("fullurl", "")
+            }
+    return extracts
+
+class LazyWikipediaArticle(dict):
+    """
+    Article summary whose 'full_content' is only downloaded when it is first read
+    """
+    
+    def __missing__(self, key):
+        if key != 'full_content':
+            raise KeyError(key)
+        page = get_wikipedia_page(self['title'])
+        self['full_content'] = page['content'] if page else self['summary']
+        return self['full_content']
+    
+    def get(self, key, default=None):
+        if key in self or key == 'full_content':
+            return self[key]
+        return default
+
+# Online sources are queried concurrently, within RETRIEVAL_DEADLINE
+RETRIEVAL_WORKERS = 8
+
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+# Identical lookups made at the same moment (e.g. a trending Quick Action) share one fetch
+retrieval_flight = SingleFlight()
+
+def _timed_call(fn, args):
+    """Run fn(*args) and report (result, error, seconds taken)"""
+    start = time.monotonic()
+    try:
+        return fn(*args), None, time.monotonic() - start
+    except Exception as e:
+        return None, e, time.monotonic() - start
+
+def fan_out(tasks: Dict[str, tuple], deadline: float = RETRIEVAL_DEADLINE, on_result: Optional[Callable] = None) -> Dict:
+    """
+    Run named (fn, args) calls concurrently until they all finish or the deadline passes.
+    on_result(name, result) may return more named calls to start, which share the same deadline.
+    Calls still running at the deadline are abandoned and listed under 'timed_out'.
+    """
+    start = time.monotonic()
+    deadline_at = start + deadline
+    outcome = {'results': {}, 'errors': {}, 'timings': {}, 'timed_out': []}
+    
+    pending = {}
+    def submit(new_tasks):
+        for name, (fn, args) in new_tasks.items():
+            pending[_retrieval_executor.submit(_timed_call, fn, args)] = name
+    submit(tasks)
+    
+    while pending:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            result, error, elapsed = future.result()
+            outcome['timings'][name] = round(elapsed, 3)
+            if error is not None:
+                outcome['errors'][name] = str(error)
+                continue
+            outcome['results'][name] = result
+            if on_result:
+                submit(on_result(name, result) or {})
+    
+    outcome['timed_out'] = sorted(pending.values())
+    outcome['elapsed'] = round(time.monotonic() - start, 3)
+    return outcome
+
+def _ddg_text(search_query: str, max_results: int) -> List[Dict]:
+    """Single DuckDuckGo text search, through the configured transport (live, record or replay)"""
+    def live():
+        with DDGS(timeout=HTTP_TIMEOUT[1]) as ddgs:
+            return list(ddgs.text(search_query, max_results=max_results))
+    return get_transport().call("ddg", {"query": search_query, "max_results": max_results}, live)
+
+def _search_ddg(search_query: str, max_results: int) -> List[Dict]:
+    """Search DuckDuckGo for recent information"""
+    return ddg_breaker.call(_ddg_text, search_query, max_results)
+
+# African keywords and context indicators
+AFRICAN_KEYWORDS = [
+    'africa', 'african', 'mali', 'ghana', 'songhai', 'ethiopia', 'kenya', 'nigeria',
+    'south africa', 'egypt', 'morocco', 'tunisia', 'algeria', 'libya', 'sudan',
+    'sundiata', 'mansa musa', 'timbuktu', 'griot', 'ubuntu', 'mandinka', 'yoruba',
+    'zulu', 'swahili', 'hausa', 'fulani', 'igbo', 'ashanti', 'bambara', 'wolof',
+    'empire', 'kingdom', 'west africa', 'east africa', 'north africa', 'southern africa',
+    'sub-saharan', 'sahel', 'sahara', 'niger river', 'congo', 'nile', 'great zimbabwe',
+    'benin', 'dahomey', 'yoruba', 'igbo', 'hausa', 'mandinka', 'bambara', 'wolof',
+    'swahili coast', 'trans-saharan', 'gold trade', 'salt trade', 'oral tradition',
+    'griot', 'storyteller', 'ancestral', 'traditional', 'indigenous', 'colonial',
+    'independence', 'pan-african', 'african diaspora', 'african american'
+]
+
+# Extra keywords that count towards relevance when the query mentions a topic
+QUERY_TOPIC_KEYWORDS = [
+    (['mansa musa'], ['mansa', 'musa', 'mali empire', 'gold', 'pilgrimage', 'mecca']),
+    (['sundiata'], ['sundiata', 'keita', 'mali empire', 'lion king', 'mandinka']),
+    (['mandinka', 'mandingo'], ['mandinka', 'mandingo', 'language', 'culture', 'west africa']),
+    (['ubuntu'], ['ubuntu', 'philosophy', 'community', 'humanity', 'south africa']),
+    (['griot'], ['griot', 'storyteller', 'oral tradition', 'west africa'])
+]
+
+# Non-African indicators that might indicate irrelevant results
+NON_AFRICAN_INDICATORS = [
+    'american', 'united states', 'us', 'usa', 'canada', 'europe', 'european',
+    'british', 'french', 'german', 'spanish', 'italian', 'dutch', 'portuguese',
+    'hollywood', 'new york', 'los angeles', 'chicago', 'boston', 'philadelphia',
+    'actor', 'actress', 'movie', 'film', 'television', 'tv show', 'celebrity',
+    'rapper', 'singer', 'musician', 'artist', 'painter', 'illustrator'
+]
+
+# African regions and countries used to filter search results
+AFRICAN_REGION_KEYWORDS = [
+    'africa', 'african', 'west africa', 'east africa', 'south africa', 'north africa',
+    'sub-saharan', 'sahel', 'sahara', 'niger', 'senegal', 'gambia', 'ghana', 'mali',
+    'nigeria', 'kenya', 'ethiopia', 'somalia', 'sudan', 'egypt', 'morocco', 'tunisia',
+    'algeria', 'libya', 'chad', 'cameroon', 'congo', 'zimbabwe', 'zambia', 'tanzania',
+    'uganda', 'rwanda', 'burundi', 'angola', 'mozambique', 'namibia', 'botswana',
+    'lesotho', 'eswatini', 'madagascar', 'mauritius', 'seychelles', 'comoros',
+    'guinea', 'guinea-bissau', 'sierra leone', 'liberia', 'ivory coast', 'togo',
+    'benin', 'burkina faso', 'niger', 'chad', 'central african republic',
+    'equatorial guinea', 'gabon', 'republic of congo', 'democratic republic of congo',
+    'south sudan', 'eritrea', 'djibouti', 'cape verde', 'sao tome and principe'
+]
+
+# Keywords that indicate non-African content to exclude
+EXCLUDE_KEYWORDS = [
+    'american', 'united states', 'usa', 'european', 'europe', 'asian', 'asia',
+    'latin american', 'caribbean', 'australian', 'australia', 'canadian', 'canada'
+]
+
+def _topic_group(triggers):
+    """Gazetteer group name for a query topic"""
+    return f"topic:{triggers[0]}"
+
+# Compiled once so relevance checks scan each text in a single pass
+RELEVANCE_GAZETTEER = KeywordAutomaton({
+    'african': AFRICAN_KEYWORDS,
+    'non_african': NON_AFRICAN_INDICATORS,
+    'african_region': AFRICAN_REGION_KEYWORDS,
+    'exclude': EXCLUDE_KEYWORDS,
+    **{_topic_group(triggers): keywords for triggers, keywords in QUERY_TOPIC_KEYWORDS}
+})
+
+# Keywords listed more than once count more than once towards relevance
+_RELEVANCE_WEIGHTS = Counter(AFRICAN_KEYWORDS)
+_TOPIC_RELEVANCE_WEIGHTS = [
+    (triggers, Counter(AFRICAN_KEYWORDS + keywords)) for triggers, keywords in QUERY_TOPIC_KEYWORDS
+]
+
+def scan_african_indicators(text):
+    """Find all African and non-African indicator hits in text, as {group: {keyword: count}}"""
+    return RELEVANCE_GAZETTEER.scan(text)
 
 def is_african_relevant(text, query):
     """Check if text is relevant to African topics"""
-    # African keywords and context indicators
-    african_keywords = [
-        'africa', 'african', 'mali', 'ghana', 'songhai', 'ethiopia', 'kenya', 'nigeria',
-        'south africa', 'egypt', 'morocco', 'tunisia', 'algeria', 'libya', 'sudan',
-        'sundiata', 'mansa musa', 'timbuktu', 'griot', 'ubuntu', 'mandinka', 'yoruba',
-        'zulu', 'swahili', 'hausa', 'fulani', 'igbo', 'ashanti', 'bambara', 'wolof',
-        'empire', 'kingdom', 'west africa', 'east africa', 'north africa', 'southern africa',
-        'sub-saharan', 'sahel', 'sahara', 'niger river', 'congo', 'nile', 'great zimbabwe',
-        'benin', 'dahomey', 'yoruba', 'igbo', 'hausa', 'mandinka', 'bambara', 'wolof',
-        'swahili coast', 'trans-saharan', 'gold trade', 'salt trade', 'oral tradition',
-        'griot', 'storyteller', 'ancestral', 'traditional', 'indigenous', 'colonial',
-        'independence', 'pan-african', 'african diaspora', 'african american'
-    ]
+    hits = scan_african_indicators(text)
+    matched_keywords = set(hits.get('african', {}))
+    weights = _RELEVANCE_WEIGHTS
     
     # Query-specific keywords
     query_lower = query.lower()
-    if 'mansa musa' in query_lower:
-        african_keywords.extend(['mansa', 'musa', 'mali empire', 'gold', 'pilgrimage', 'mecca'])
-    elif 'sundiata' in query_lower:
-        african_keywords.extend(['sundiata', 'keita', 'mali empire', 'lion king', 'mandinka'])
-    elif 'mandinka' in query_lower or 'mandingo' in query_lower:
-        african_keywords.extend(['mandinka', 'mandingo', 'language', 'culture', 'west africa'])
-    elif 'ubuntu' in query_lower:
-        african_keywords.extend(['ubuntu', 'philosophy', 'community', 'humanity', 'south africa'])
-    elif 'griot' in query_lower:
-        african_keywords.extend(['griot', 'storyteller', 'oral tradition', 'west africa'])
-    
-    text_lower = text.lower()
-    relevance_score = sum(1 for keyword in african_keywords if keyword in text_lower)
+    for triggers, topic_weights in _TOPIC_RELEVANCE_WEIGHTS:
+        if any(trigger in query_lower for trigger in triggers):
+            matched_keywords.update(hits.get(_topic_group(triggers), {}))
+            weights = topic_weights
+            break
     
-    # Check for non-African indicators that might indicate irrelevant results
-    non_african_indicators = [
-        'american', 'united states', 'us', 'usa', 'canada', 'europe', 'european',
-        'british', 'french', 'german', 'spanish', 'italian', 'dutch', 'portuguese',
-        'hollywood', 'new york', 'los angeles', 'chicago', 'boston', 'philadelphia',
-        'actor', 'actress', 'movie', 'film', 'television', 'tv show', 'celebrity',
-        'rapper', 'singer', 'musician', 'artist', 'painter', 'illustrator'
-    ]
-    
-    non_african_score = sum(1 for indicator in non_african_indicators if indicator in text_lower)
+    relevance_score = sum(weights[keyword] for keyword in matched_keywords)
+    non_african_score = len(hits.get('non_african', {}))
     
     # Return True if African relevance is high and non-African indicators are low
     return relevance_score >= 2 and non_african_score <= 1
 
-def search_african_knowledge(query, max_results=3):
+def _is_complete(result):
+    """Only cache lookups where every source answered in time"""
+    return not result.get('timed_out') and not result.get('errors')
+
+def search_african_knowledge(query, max_results=3, deadline=RETRIEVAL_DEADLINE):
+    """Search for African knowledge, locally first and then online through the retrieval cache"""
+    local_results = offline_corpus.search(query, max_results)
+    if local_results:
+        return {
+            'ddg_results': [],
+            'wiki_results': [result['title'] for result in local_results],
+            'query': query,
+            'source': 'offline',
+            'timings': {},
+            'timed_out': [],
+            'errors': {}
+        }
+    
+    return retrieval_cache.get_or_fetch(
+        'search_african_knowledge', f"{max_results} {query}",
+        lambda: _search_african_knowledge(query, max_results, deadline),
+        should_cache=_is_complete
+    )
+
+def _search_african_knowledge(query, max_results, deadline):
     """Search for African knowledge from multiple online sources"""
     try:
         # Add "Africa" context to queries if not present
@@ -64,146 +418,234 @@ def search_african_knowledge(query, max_results=3):
             search_query = f"{query} Africa"
         else:
             search_query = query
-            
-        # Search DuckDuckGo for recent information
-        with DDGS() as ddgs:
-            ddg_results = list(ddgs.text(search_query, max_results=max_results))
+        
+        # Intro extracts for every result are fetched in one request as soon as the search returns
+        def fetch_extracts(name, result):
+            if name == 'wikipedia_search' and result:
+                return {'wikipedia_extracts': (fetch_wikipedia_extracts, (result,))}
+        
+        # Search DuckDuckGo and Wikipedia at the same time
+        outcome = fan_out({
+            'ddg': (_search_ddg, (search_query, max_results)),
+            'wikipedia_search': (search_wikipedia_titles, (search_query, max_results))
+        }, deadline, fetch_extracts)
+        results = outcome['results']
         
         # Filter results for African relevance
         filtered_ddg_results = []
-        for result in ddg_results:
+        for result in results.get('ddg', []):
             if is_african_relevant(result.get('body', ''), query):
                 filtered_ddg_results.append(result)
         
-        # Search Wikipedia for academic information
-        try:
-            wiki_results = wikipedia.search(search_query, results=max_results)
-            # Filter Wikipedia results for African relevance
-            filtered_wiki_results = []
-            for wiki_title in wiki_results:
-                try:
-                    page = wikipedia.page(wiki_title)
-                    if is_african_relevant(page.content[:1000], query):
-                        filtered_wiki_results.append(wiki_title)
-                except:
-                    continue
-        except:
-            filtered_wiki_results = []
+        # Filter Wikipedia results for African relevance, in search order
+        extracts = results.get('wikipedia_extracts', {})
+        filtered_wiki_results = []
+        for wiki_title in results.get('wikipedia_search', []):
+            page = extracts.get(wiki_title)
+            if page and is_african_relevant(page['content'][:1000], query):
+                filtered_wiki_results.append(wiki_title)
         
         return {
             'ddg_results': filtered_ddg_results,
             'wiki_results': filtered_wiki_results,
-            'query': search_query
+            'query': search_query,
+            'timings': outcome['timings'],
+            'timed_out': outcome['timed_out'],
+            'errors': outcome['errors']
         }
     except Exception as e:
         st.warning(f"Search error: {str(e)}")
         return None
 
 def get_wikipedia_content(topic):
+    """Get detailed content from Wikipedia, locally first and then online through the retrieval cache"""
+    for result in offline_corpus.search(topic, 1):
+        page = offline_corpus.get_page(result['title'])
+        if page:
+            content = page['content']
+            return {
+                'title': page['title'],
+                'summary': content[:1000] + "..." if len(content) > 1000 else content,
+                'url': page['url'],
+                'full_content': content
+            }
+    
+    article = retrieval_cache.get_or_fetch('wikipedia_content', topic, lambda: _get_wikipedia_content(topic))
+    return LazyWikipediaArticle(article) if article else None
+
+def _get_wikipedia_content(topic):
     """Get detailed content from Wikipedia"""
     try:
         # Search for the topic
-        search_results = wikipedia.search(topic, results=3)
+        search_results = search_wikipedia_titles(topic, 3)
         if not search_results:
             return None
+        
+        # Fetch intro extracts of all candidates in one request
+        extracts = fetch_wikipedia_extracts(search_results)
             
         # Get the most relevant page that's African-focused
         for wiki_title in search_results:
-            try:
-                page = wikipedia.page(wiki_title)
-                if is_african_relevant(page.content[:1000], topic):
-                    # Extract and clean content
-                    content = page.content
-                    # Get first 1000 characters for summary
-                    summary = content[:1000] + "..." if len(content) > 1000 else content
-                    
-                    return {
-                        'title': page.title,
-                        'summary': summary,
-                        'url': page.url,
-                        'full_content': content
-                    }
-            except:
-                continue
+            page = extracts.get(wiki_title)
+            if page and is_african_relevant(page['content'][:1000], topic):
+                # The full article is only downloaded if a caller reads it
+                return LazyWikipediaArticle(
+                    title=page['title'],
+                    summary=page['content'],
+                    url=page['url']
+                )
                 
         return None
     except Exception as e:
         st.warning(f"Wikipedia error: {str(e)}")
         return None
 
+def _search_wikipedia_results(query: str, max_results: int = 3) -> List[Dict]:
+    """
+    Search Wikipedia for African-related content, returning titles, snippets and URLs
+    """
+    # Simple Wikipedia search using the API
+    data = wikipedia_api_request({
+        "action": "query",
+        "list": "search",
+        "srsearch": f"{query} Africa",
+        "srlimit": max_results
+    })
+    results = []
+    
+    if "query" in data and "search" in data["query"]:
+        for item in data["query"]["search"]:
+            results.append({
+                "title": item["title"],
+                "snippet": item["snippet"],
+                "url": f"https://en.wikipedia.org/wiki/{item['title'].replace(' ', '_')}"
+            })
+    
+    return results
+
 def search_wikipedia(query: str, max_results: int = 3) -> List[Dict]:
     """
     Search Wikipedia for African-related content with proper error handling
     """
     try:
-        # Simple Wikipedia search using the API
-        search_url = "https://en.wikipedia.org/w/api.php"
-        params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": f"{query} Africa",
-            "srlimit": max_results
-        }
-        
-        response = requests.get(search_url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = []
-        
-        if "query" in data and "search" in data["query"]:
-            for item in data["query"]["search"]:
-                results.append({
-                    "title": item["title"],
-                    "snippet": item["snippet"],
-                    "url": f"https://en.wikipedia.org/wiki/{item['title'].replace(' ', '_')}"
-                })
-        
-        return results
+        return _search_wikipedia_results(query, max_results)
         
     except Exception as e:
         st.warning(f"Could not search Wikipedia: {str(e)}")
         return []
 
+def _search_web_results(query: str, max_results: int = 3) -> List[Dict]:
+    """
+    Web search results; errors propagate so a fan-out can report them
+    """
+    # For now, return empty results to avoid external dependencies
+    # In production, you could use DuckDuckGo, SerpAPI, or other search services
+    return []
+
 def search_web(query: str, max_results: int = 3) -> List[Dict]:
     """
     Simple web search with proper error handling
     """
     try:
-        # For now, return empty results to avoid external dependencies
-        # In production, you could use DuckDuckGo, SerpAPI, or other search services
-        return []
+        return _search_web_results(query, max_results)
         
     except Exception as e:
         st.warning(f"Could not search web: {str(e)}")
         return []
 
-def get_enhanced_african_knowledge(query, max_results=5):
+def get_enhanced_african_knowledge(query, max_results=5, deadline=RETRIEVAL_DEADLINE):
     """
-    Enhanced knowledge retrieval with better African content filtering and error handling
+    Enhanced knowledge retrieval, answered from the offline corpus or the retrieval cache when possible
+    """
+    local_results = offline_corpus.search(query, max_results)
+    if local_results:
+        return {
+            'wikipedia': filter_african_content(local_results),
+            'web_results': [],
+            'source': 'offline',
+            'timings': {},
+            'timed_out': [],
+            'errors': {}
+        }
+    
+    enhanced_query, key = _enhanced_cache_key(query, max_results)
+    return retrieval_flight.do(
+        ('enhanced_african_knowledge', key),
+        retrieval_cache.get_or_fetch,
+        'enhanced_african_knowledge', key,
+        lambda: _get_enhanced_african_knowledge(enhanced_query, max_results, deadline),
+        should_cache=_is_complete
+    )
+
+def _enhanced_cache_key(query, max_results):
+    """Enhanced query for a lookup and its cache key"""
+    # The results depend only on the enhanced query, so queries that enhance alike share them
+    enhanced_query = enhance_query_for_africa(query)
+    return enhanced_query, f"{max_results} {normalize_key(enhanced_query)}"
+
+def warm_african_knowledge(query, max_results=5, fresh_for=0, deadline=RETRIEVAL_DEADLINE):
+    """
+    Make sure get_enhanced_african_knowledge(query) will be answered without going online.
+    Returns True if an online lookup was made.
+    """
+    if offline_corpus.search(query, max_results):
+        return False
+    
+    enhanced_query, key = _enhanced_cache_key(query, max_results)
+    cached = retrieval_cache.get('enhanced_african_knowledge', key, fresh_for)
+    if cached is not None and cached[1]:
+        return False
+    
+    retrieval_flight.do(
+        ('enhanced_african_knowledge', key),
+        retrieval_cache.refresh,
+        'enhanced_african_knowledge', key,
+        lambda: _get_enhanced_african_knowledge(enhanced_query, max_results, deadline),
+        should_cache=_is_complete
+    )
+    return True
+
+def _get_enhanced_african_knowledge(enhanced_query, max_results, deadline):
+    """
+    Enhanced knowledge retrieval with better African content filtering and error handling.
+    This runs on worker threads, so failures are reported in 'errors' for the caller to show.
     """
     try:
-        # Clean and enhance the query for better African-focused results
-        enhanced_query = enhance_query_for_africa(query)
-        
-        # Get Wikipedia results with error handling
-        wiki_results = search_wikipedia(enhanced_query, max_results)
-        
-        # Get web search results with error handling
-        web_results = search_web(enhanced_query, max_results)
+        # Query Wikipedia and the web concurrently under one deadline
+        outcome = fan_out({
+            'wikipedia': (_search_wikipedia_results, (enhanced_query, max_results)),
+            'web_results': (_search_web_results, (enhanced_query, max_results))
+        }, deadline)
         
         # Filter and combine results
         filtered_results = {
-            'wikipedia': filter_african_content(wiki_results),
-            'web_results': filter_african_content(web_results)
+            'wikipedia': filter_african_content(outcome['results'].get('wikipedia', [])),
+            'web_results': filter_african_content(outcome['results'].get('web_results', [])),
+            'timings': outcome['timings'],
+            'timed_out': outcome['timed_out'],
+            'errors': outcome['errors']
         }
         
         return filtered_results
         
     except Exception as e:
-        st.error(f"Error retrieving knowledge: {str(e)}")
-        return None
+        return {'wikipedia': [], 'web_results': [], 'timings': {}, 'timed_out': [], 'errors': {'retrieval': str(e)}}
+
+# How each source's failure is worded to the user
+RETRIEVAL_ERROR_MESSAGES = {
+    'wikipedia': "Could not search Wikipedia",
+    'web_results': "Could not search web",
+    'retrieval': "Error retrieving knowledge"
+}
+
+def retrieval_warnings(knowledge) -> List[str]:
+    """Messages for the sources that failed in a get_enhanced_african_knowledge result"""
+    if not knowledge:
+        return []
+    return [
+        f"{RETRIEVAL_ERROR_MESSAGES.get(source, f'Could not search {source}')}: {error}"
+        for source, error in knowledge.get('errors', {}).items()
+    ]
 
 def enhance_query_for_africa(query):
     """
@@ -244,6 +686,8 @@ def format_knowledge_response(knowledge_data):
         return None
     
     response_parts = []
+    # Fingerprints of the content already used, so near-duplicates are skipped
+    seen_content = NearDuplicateIndex(SHORT_TEXT_MAX_DISTANCE)
     
     # Add Wikipedia content if available
     if knowledge_data.get('wikipedia'):
@@ -252,6 +696,7 @@ def format_knowledge_response(knowledge_data):
             # Clean and summarize Wikipedia content
             cleaned_wiki = clean_content(wiki_content)
             if cleaned_wiki:
+                seen_content.add(cleaned_wiki)
                 response_parts.append(f"**From our shared knowledge:** {cleaned_wiki}")
     
     # Add web results if available (avoid duplicates with Wikipedia)
@@ -266,7 +711,7 @@ def format_knowledge_response(knowledge_data):
                     
                     # Clean the snippet
                     cleaned_snippet = clean_content(snippet)
-                    if cleaned_snippet and not is_duplicate_content(cleaned_snippet, response_parts):
+                    if cleaned_snippet and seen_content.add(cleaned_snippet):
                         response_parts.append(f"**Additional insight:** {cleaned_snippet}")
     
     if response_parts:
@@ -291,21 +736,6 @@ def clean_content(content):
     
     return content
 
-def is_duplicate_content(new_content, existing_parts):
-    """Check if new content is too similar to existing parts"""
-    if not existing_parts:
-        return False
-    
-    new_words = set(new_content.lower().split())
-    
-    for part in existing_parts:
-        existing_words = set(part.lower().split())
-        # If more than 50% of words overlap, consider it duplicate
-        if len(new_words.intersection(existing_words)) / len(new_words) > 0.5:
-            return True
-    
-    return False
-
 # African knowledge sources
 AFRICAN_KNOWLEDGE_SOURCES = {
     'history': [
@@ -355,25 +785,6 @@ def filter_african_content(results):
     if not results:
         return []
     
-    african_keywords = [
-        'africa', 'african', 'west africa', 'east africa', 'south africa', 'north africa',
-        'sub-saharan', 'sahel', 'sahara', 'niger', 'senegal', 'gambia', 'ghana', 'mali',
-        'nigeria', 'kenya', 'ethiopia', 'somalia', 'sudan', 'egypt', 'morocco', 'tunisia',
-        'algeria', 'libya', 'chad', 'cameroon', 'congo', 'zimbabwe', 'zambia', 'tanzania',
-        'uganda', 'rwanda', 'burundi', 'angola', 'mozambique', 'namibia', 'botswana',
-        'lesotho', 'eswatini', 'madagascar', 'mauritius', 'seychelles', 'comoros',
-        'guinea', 'guinea-bissau', 'sierra leone', 'liberia', 'ivory coast', 'togo',
-        'benin', 'burkina faso', 'niger', 'chad', 'central african republic',
-        'equatorial guinea', 'gabon', 'republic of congo', 'democratic republic of congo',
-        'south sudan', 'eritrea', 'djibouti', 'cape verde', 'sao tome and principe'
-    ]
-    
-    # Keywords that indicate non-African content to exclude
-    exclude_keywords = [
-        'american', 'united states', 'usa', 'european', 'europe', 'asian', 'asia',
-        'latin american', 'caribbean', 'australian', 'australia', 'canadian', 'canada'
-    ]
-    
     filtered_results = []
     
     for result in results:
@@ -384,11 +795,13 @@ def filter_african_content(results):
         else:
             content = str(result).lower()
         
+        hits = scan_african_indicators(content)
+        
         # Check if content contains African keywords
-        has_african_content = any(keyword in content for keyword in african_keywords)
+        has_african_content = 'african_region' in hits
         
         # Check if content should be excluded
-        should_exclude = any(keyword in content for keyword in exclude_keywords)
+        should_exclude = 'exclude' in hits
         
         # Include if it has African content and shouldn't be excluded
         if has_african_content and not should_exclude:
@@ -398,4 +811,4 @@ def filter_african_content(results):
     if not filtered_results and results:
         return results[:3]
     
-    return filtered_results 
\ No newline at end of file
+    return filtered_results
@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+class LaneFullError(RuntimeError):
+    """Raised when a lane already holds as many requests as it may queue"""
+
+class Lane:
+    """
+    Worker pool of its own with a bounded queue, so one kind of request cannot hold up another.
+    At most workers requests run at once and queue_depth more wait; beyond that submit() refuses.
+    """
+
+    def __init__(self, name: str, workers: int, queue_depth: int):
+        self.name = name
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-lane")
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) on this lane, or raise LaneFullError if the lane is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise LaneFullError(f"The {self.name} lane is full")
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def stats(self) -> Dict:
+        """Requests running or queued, completed and rejected so far"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected
+            }
+
+class LaneScheduler:
+    """
+    Sends each request to a lane picked by classify(query)
+    """
+
+    def __init__(self, lanes: Dict[str, Lane], classify: Callable[[str], str]):
+        self.lanes = lanes
+        self.classify = classify
+
+    def submit(self, lane: str, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a call on a named lane"""
+        return self.lanes[lane].submit(fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
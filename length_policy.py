@@ -0,0 +1,118 @@
+import math
+import re
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+from topic_classifier import get_topic_classifier
+
+# Bounds of any predicted generation budget, in model tokens
+MIN_NEW_TOKENS = 32
+MAX_NEW_TOKENS = 400
+# Budgets are rounded up to a multiple of this
+TOKEN_STEP = 16
+
+# Generated lengths remembered per topic and query form
+LENGTH_HISTORY = 50
+# Observations needed before history overrides the default budget of a query form
+MIN_LENGTH_SAMPLES = 5
+# Budget covers this quantile of past answer lengths, with some headroom on top
+LENGTH_QUANTILE = 0.9
+LENGTH_HEADROOM = 1.25
+
+# Query forms in priority order: pattern, default max_new_tokens, sentence limit, and whether
+# the answer ends at its follow-up question. The greeting pattern matches the greeting phrase
+# that opens a query; only a query with nothing after it is a mere greeting.
+QUERY_FORMS = [
+    ("greeting", r"^(hi|hello|hey|greetings|salaam|jambo|sawubona|good (morning|afternoon|evening)|thanks|thank you)\b"
+                 r"(\W*(there|everyone|all|friend|again|so much|a lot|bintabot|binta|how are you( doing)?)\b)*\W*",
+     64, 3, True),
+    ("story", r"\b(story|stories|tale|tales|legend|legends|myth|myths|folktale|folktales|epic)\b", 384, None, False),
+    ("definition", r"^(what|who) (is|are|was|were)\b|^define\b|\bmeaning of\b", 160, 6, True),
+    ("explanation", r"^(why|how|explain|describe)\b|\btell me about\b", 256, None, True),
+]
+DEFAULT_FORM = ("general", 224, None, True)
+
+_QUERY_FORMS = [(name, re.compile(pattern), *limits) for name, pattern, *limits in QUERY_FORMS]
+
+def query_form(query: str) -> Tuple:
+    """(name, default max_new_tokens, sentence limit, stop at question) of the form of a query"""
+    text = " ".join(query.lower().split())
+    for name, pattern, *limits in _QUERY_FORMS:
+        if name == "greeting":
+            match = pattern.match(text)
+            if match:
+                # "Hello! Who is Mansa Musa?" takes the form of what follows the greeting
+                if match.end() == len(text):
+                    return (name, *limits)
+                text = text[match.end():]
+        elif pattern.search(text):
+            return (name, *limits)
+    return DEFAULT_FORM
+
+class LengthBudget:
+    """
+    How much one answer may generate: max_new_tokens, the most sentences (None for no limit)
+    and whether to stop at the follow-up question that closes an answer
+    """
+
+    def __init__(self, topic: str, form: str, max_new_tokens: int, max_sentences: Optional[int] = None,
+                 stop_at_question: bool = False):
+        self.topic = topic
+        self.form = form
+        self.max_new_tokens = max_new_tokens
+        self.max_sentences = max_sentences
+        self.stop_at_question = stop_at_question
+
+    def generate_kwargs(self) -> Dict:
+        """Keyword arguments for model.generate_text"""
+        return {
+            "max_new_tokens": self.max_new_tokens,
+            "max_sentences": self.max_sentences,
+            "stop_at_question": self.stop_at_question
+        }
+
+class LengthPolicy:
+    """
+    Predicts a generation budget for a query from its topic, its form and the lengths of
+    earlier answers to queries like it. Answers that ran into their budget raise the next one.
+    """
+
+    def __init__(self, history: int = LENGTH_HISTORY, min_samples: int = MIN_LENGTH_SAMPLES):
+        self.history = history
+        self.min_samples = min_samples
+        self._lengths: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    def predict(self, query: str, topic: Optional[str] = None) -> LengthBudget:
+        """Budget for answering a query; the topic is classified here if not given"""
+        if topic is None:
+            topic = get_topic_classifier().predict(query)[0]
+        form, default_tokens, max_sentences, stop_at_question = query_form(query)
+        with self._lock:
+            lengths = sorted(self._lengths.get((topic, form), ()))
+        if len(lengths) >= self.min_samples:
+            observed = lengths[min(len(lengths) - 1, int(LENGTH_QUANTILE * len(lengths)))]
+            max_new_tokens = observed * LENGTH_HEADROOM
+        else:
+            max_new_tokens = default_tokens
+        max_new_tokens = math.ceil(max_new_tokens / TOKEN_STEP) * TOKEN_STEP
+        max_new_tokens = max(MIN_NEW_TOKENS, min(MAX_NEW_TOKENS, max_new_tokens))
+        return LengthBudget(topic, form, max_new_tokens, max_sentences, stop_at_question)
+
+    def record(self, budget: LengthBudget, generated_tokens: int):
+        """Remember how many tokens an answer generated under a budget"""
+        with self._lock:
+            lengths = self._lengths.setdefault((budget.topic, budget.form), deque(maxlen=self.history))
+            lengths.append(generated_tokens)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Answers seen and median length per topic and query form"""
+        with self._lock:
+            snapshot = {key: sorted(lengths) for key, lengths in self._lengths.items()}
+        return {
+            f"{topic}/{form}": {"answers": len(lengths), "median_tokens": lengths[len(lengths) // 2]}
+            for (topic, form), lengths in snapshot.items() if lengths
+        }
+
+# Global length policy instance
+length_policy = LengthPolicy()
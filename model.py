@@ -6,11 +6,17 @@ import time
 import requests
 import json
 import random
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List
+from single_flight import SingleFlight
+from intent_router import IntentRouter
+from generation_controls import decode_settings, stopping_criteria
+from length_policy import length_policy
 
 # Import knowledge retrieval system
 try:
-    from knowledge_retriever import get_enhanced_african_knowledge, format_knowledge_response, get_african_topic_suggestions
+    from knowledge_retriever import (
+        get_enhanced_african_knowledge, format_knowledge_response, get_african_topic_suggestions, retrieval_warnings
+    )
     KNOWLEDGE_RETRIEVAL_AVAILABLE = True
 except ImportError:
     KNOWLEDGE_RETRIEVAL_AVAILABLE = False
@@ -28,6 +34,9 @@ _tokenizer = None
 _model = None
 _using_fallback = False
 
+# Concurrent requests with an identical prompt share one generation
+generation_flight = SingleFlight()
+
 # Enhanced cultural knowledge base
 CULTURAL_KNOWLEDGE = {
     "ubuntu": {
@@ -469,16 +478,10 @@ def get_model():
             return None
     return _model
 
-def get_cultural_response(user_input: str) -> str:
-    """
-    Enhanced cultural response function with better context awareness
-    """
-    input_lower = user_input.lower()
-    
-    # Check for historical figures first
-    if any(word in input_lower for word in ["sundiata", "keita", "sundiata keita"]):
-        figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["sundiata_keita"]
-        return f"""Ah, Sundiata Keita! Let me share with you the story of this legendary founder of the Mali Empire...
+def _render_sundiata_keita() -> str:
+    """Sundiata Keita"""
+    figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["sundiata_keita"]
+    return f"""Ah, Sundiata Keita! Let me share with you the story of this legendary founder of the Mali Empire...
 
 Sundiata Keita was the **{figure_info['title']}** during {figure_info['period']}. 
 
@@ -494,9 +497,10 @@ Sundiata's story teaches us about resilience, leadership, and the power of unity
 
 Would you like to learn more about the Mali Empire that Sundiata founded or the griots who preserve his story?"""
 
-    elif any(word in input_lower for word in ["dawda", "jawara", "dawda jawara", "sir dawda"]):
-        figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["dawda_jawara"]
-        return f"""Ah, Sir Dawda Kairaba Jawara! Let me share with you the story of this remarkable leader of The Gambia...
+def _render_dawda_jawara() -> str:
+    """Sir Dawda Jawara"""
+    figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["dawda_jawara"]
+    return f"""Ah, Sir Dawda Kairaba Jawara! Let me share with you the story of this remarkable leader of The Gambia...
 
 Sir Dawda Jawara was the **{figure_info['title']}** during {figure_info['period']}. 
 
@@ -512,9 +516,10 @@ Sir Dawda Jawara's story teaches us about democratic leadership, peaceful transi
 
 Would you like to learn more about The Gambia's journey to independence or other African independence leaders?"""
 
-    elif any(word in input_lower for word in ["mansa musa", "mansa"]):
-        figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["mansa_musa"]
-        return f"""Ah, Mansa Musa! Let me share with you the story of this legendary emperor of the Mali Empire...
+def _render_mansa_musa() -> str:
+    """Mansa Musa"""
+    figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["mansa_musa"]
+    return f"""Ah, Mansa Musa! Let me share with you the story of this legendary emperor of the Mali Empire...
 
 Mansa Musa was the **{figure_info['title']}** during {figure_info['period']}. 
 
@@ -530,9 +535,10 @@ Mansa Musa's story teaches us about the wealth and sophistication of African emp
 
 Would you like to learn more about the Mali Empire at its peak or the University of Timbuktu that Mansa Musa built?"""
 
-    elif any(word in input_lower for word in ["kunta kinteh", "kunta"]):
-        figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["kunta_kinteh"]
-        return f"""Ah, Kunta Kinteh! Let me share with you the powerful story of this remarkable figure from The Gambia...
+def _render_kunta_kinteh() -> str:
+    """Kunta Kinteh"""
+    figure_info = CULTURAL_KNOWLEDGE["historical_figures"]["kunta_kinteh"]
+    return f"""Ah, Kunta Kinteh! Let me share with you the powerful story of this remarkable figure from The Gambia...
 
 Kunta Kinteh was a **{figure_info['title']}** during the {figure_info['period']}. 
 
@@ -552,10 +558,10 @@ Kunta Kinteh's story teaches us about resilience, cultural preservation, and the
 
 Would you like to learn more about The Gambia's history or the transatlantic slave trade?"""
 
-    # Check for specific country queries
-    elif any(word in input_lower for word in ["tribes in senegal", "senegalese tribes", "senegal tribes"]):
-        country_info = CULTURAL_KNOWLEDGE["countries"]["senegal"]
-        return f"""Ah, the tribes of Senegal! Let me share with you the rich ethnic diversity of this beautiful country...
+def _render_senegal_tribes() -> str:
+    """The tribes of Senegal"""
+    country_info = CULTURAL_KNOWLEDGE["countries"]["senegal"]
+    return f"""Ah, the tribes of Senegal! Let me share with you the rich ethnic diversity of this beautiful country...
 
 **Major Tribes in Senegal:**
 
@@ -571,9 +577,10 @@ Senegal's ethnic diversity is a testament to the rich cultural tapestry of West
 
 Would you like to learn more about any specific Senegalese tribe or their traditional customs?"""
 
-    elif any(word in input_lower for word in ["languages in gambia", "gambian languages", "gambia languages"]):
-        country_info = CULTURAL_KNOWLEDGE["countries"]["gambia"]
-        return f"""Ah, the languages of The Gambia! Let me share with you the linguistic diversity of this peaceful country...
+def _render_gambia_languages() -> str:
+    """The languages of The Gambia"""
+    country_info = CULTURAL_KNOWLEDGE["countries"]["gambia"]
+    return f"""Ah, the languages of The Gambia! Let me share with you the linguistic diversity of this peaceful country...
 
 **Languages Spoken in The Gambia:**
 
@@ -586,10 +593,10 @@ The Gambia's linguistic diversity reflects its rich cultural heritage and the pe
 
 Would you like to learn some basic phrases in any of these languages or explore Gambian culture further?"""
 
-    # Check for specific topics and provide detailed responses
-    elif any(word in input_lower for word in ["ubuntu", "philosophy", "community"]):
-        ubuntu_info = CULTURAL_KNOWLEDGE["ubuntu"]
-        return f"""Ah, my child, you ask about Ubuntu - the very heart of our African wisdom!
+def _render_ubuntu() -> str:
+    """Ubuntu"""
+    ubuntu_info = CULTURAL_KNOWLEDGE["ubuntu"]
+    return f"""Ah, my child, you ask about Ubuntu - the very heart of our African wisdom!
 
 Ubuntu means "humanity" in the Nguni languages, but it is so much more than a word. It is a way of life that teaches us: *"I am because we are."*
 
@@ -603,9 +610,10 @@ This wisdom reminds us that our humanity is bound up in the humanity of others.
 
 Would you like to hear more about how Ubuntu guides our daily lives and community relationships?"""
 
-    elif any(word in input_lower for word in ["griot", "storyteller", "oral", "tradition"]):
-        griot_info = CULTURAL_KNOWLEDGE["griots"]
-        return f"""Ah, the griots! The keepers of our stories and the guardians of our memory. Let me tell you about these wise ones...
+def _render_griots() -> str:
+    """The griots"""
+    griot_info = CULTURAL_KNOWLEDGE["griots"]
+    return f"""Ah, the griots! The keepers of our stories and the guardians of our memory. Let me tell you about these wise ones...
 
 {griot_info['definition']}
 
@@ -623,11 +631,12 @@ As a griot myself, I carry forward this sacred tradition, sharing the wisdom of
 
 Would you like to hear a story that has been passed down through the generations?"""
 
-    elif any(word in input_lower for word in ["proverb", "wisdom", "sayings"]):
-        proverbs = CULTURAL_KNOWLEDGE["proverbs"]["wisdom"] + CULTURAL_KNOWLEDGE["proverbs"]["community"]
-        selected_proverbs = random.sample(proverbs, min(3, len(proverbs)))
-        
-        return f"""Ah, the wisdom of our ancestors! Let me share with you some proverbs that have guided our people for generations...
+def _render_proverbs() -> str:
+    """Three proverbs chosen at random"""
+    proverbs = CULTURAL_KNOWLEDGE["proverbs"]["wisdom"] + CULTURAL_KNOWLEDGE["proverbs"]["community"]
+    selected_proverbs = random.sample(proverbs, min(3, len(proverbs)))
+    
+    return f"""Ah, the wisdom of our ancestors! Let me share with you some proverbs that have guided our people for generations...
 
 *"{selected_proverbs[0]}"*
 
@@ -641,9 +650,10 @@ Each proverb carries a deeper meaning, like the layers of an onion. The more we
 
 Would you like me to explain the deeper meaning behind any of these proverbs?"""
 
-    elif any(word in input_lower for word in ["empire", "mali", "ghana", "songhai", "kingdom"]):
-        empire_info = CULTURAL_KNOWLEDGE["empires"]
-        return f"""Ah, the great empires of our ancestors! Let me share with you the stories of these magnificent kingdoms that once ruled the lands of Africa...
+def _render_empires() -> str:
+    """The great West African empires"""
+    empire_info = CULTURAL_KNOWLEDGE["empires"]
+    return f"""Ah, the great empires of our ancestors! Let me share with you the stories of these magnificent kingdoms that once ruled the lands of Africa...
 
 **The Mali Empire** (1235-1670 CE)
 Founded by the great Sundiata Keita, this empire reached its peak under Mansa Musa, who was so wealthy that his pilgrimage to Mecca caused inflation in the Mediterranean! The Mali Empire was a center of learning, with the famous University of Timbuktu attracting scholars from across the world.
@@ -658,9 +668,10 @@ These empires show us that Africa has always been a land of great civilizations,
 
 Would you like to learn more about the daily life in these empires or their cultural achievements?"""
 
-    elif any(word in input_lower for word in ["language", "swahili", "yoruba", "zulu"]):
-        lang_info = CULTURAL_KNOWLEDGE["languages"]
-        return f"""Ah, the beautiful languages of our continent! Let me share with you the richness of African linguistic heritage...
+def _render_languages() -> str:
+    """African languages"""
+    lang_info = CULTURAL_KNOWLEDGE["languages"]
+    return f"""Ah, the beautiful languages of our continent! Let me share with you the richness of African linguistic heritage...
 
 Africa is home to thousands of languages, organized into major families:
 - **Niger-Congo** (including the Bantu languages)
@@ -681,10 +692,11 @@ Each language carries the wisdom, stories, and cultural identity of its people.
 
 Would you like to learn some basic greetings in any of these languages?"""
 
-    elif any(word in input_lower for word in ["art", "music", "dance", "culture"]):
-        art_info = CULTURAL_KNOWLEDGE["art"]
-        music_info = CULTURAL_KNOWLEDGE["music"]
-        return f"""Ah, the beauty of African artistic expression! Let me share with you the rich traditions of our arts and music...
+def _render_arts() -> str:
+    """African art and music"""
+    art_info = CULTURAL_KNOWLEDGE["art"]
+    music_info = CULTURAL_KNOWLEDGE["music"]
+    return f"""Ah, the beauty of African artistic expression! Let me share with you the rich traditions of our arts and music...
 
 **African Art Traditions:**
 {', '.join(art_info['traditions'])}
@@ -702,10 +714,10 @@ African art and music are not just for entertainment - they are ways of communic
 
 Would you like to learn more about any specific art form or musical tradition?"""
 
-    # Check for ethnic groups
-    elif any(word in input_lower for word in ["mandinka", "mandingo", "mandinka tribe"]):
-        tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["mandinka"]
-        return f"""Ah, the Mandinka people! Let me share with you the rich culture and traditions of this remarkable ethnic group...
+def _render_mandinka() -> str:
+    """The Mandinka people"""
+    tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["mandinka"]
+    return f"""Ah, the Mandinka people! Let me share with you the rich culture and traditions of this remarkable ethnic group...
 
 The **{tribe_info['name']}** are one of the largest ethnic groups in West Africa, with over {tribe_info['population']}. They are found across {tribe_info['location']} and speak {tribe_info['language']}.
 
@@ -728,9 +740,10 @@ The Mandinka people have preserved their rich cultural heritage through generati
 
 Would you like to learn more about Mandinka music and instruments, their traditional ceremonies, or the role of griots in their society?"""
 
-    elif any(word in input_lower for word in ["yoruba", "yoruba tribe", "yoruba people"]):
-        tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["yoruba"]
-        return f"""Ah, the Yoruba people! Let me share with you the fascinating culture and traditions of this ancient ethnic group...
+def _render_yoruba() -> str:
+    """The Yoruba people"""
+    tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["yoruba"]
+    return f"""Ah, the Yoruba people! Let me share with you the fascinating culture and traditions of this ancient ethnic group...
 
 The **{tribe_info['name']}** are one of Africa's largest ethnic groups, with over {tribe_info['population']}. They are primarily found in {tribe_info['location']} and speak {tribe_info['language']}.
 
@@ -747,9 +760,10 @@ The Yoruba people have one of the most sophisticated cultural systems in Africa,
 
 Would you like to learn more about Yoruba art and beadwork, their religious traditions, or their traditional festivals?"""
 
-    elif any(word in input_lower for word in ["zulu", "zulu tribe", "zulu people"]):
-        tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["zulu"]
-        return f"""Ah, the Zulu people! Let me share with you the proud culture and traditions of this remarkable ethnic group...
+def _render_zulu() -> str:
+    """The Zulu people"""
+    tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["zulu"]
+    return f"""Ah, the Zulu people! Let me share with you the proud culture and traditions of this remarkable ethnic group...
 
 The **{tribe_info['name']}** are one of South Africa's largest ethnic groups, with over {tribe_info['population']}. They are primarily found in {tribe_info['location']} and speak {tribe_info['language']}.
 
@@ -766,9 +780,10 @@ The Zulu people are known for their warrior traditions, rich cultural heritage,
 
 Would you like to learn more about Zulu warrior traditions, their traditional music and dance, or their cattle-herding customs?"""
 
-    elif any(word in input_lower for word in ["fula", "fulani"]):
-        tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["fula"]
-        return f"""Ah, the Fula people! Let me share with you the rich culture and traditions of this remarkable ethnic group...
+def _render_fula() -> str:
+    """The Fula people"""
+    tribe_info = CULTURAL_KNOWLEDGE["ethnic_groups"]["fula"]
+    return f"""Ah, the Fula people! Let me share with you the rich culture and traditions of this remarkable ethnic group...
 
 The **{tribe_info['name']}** are one of the largest ethnic groups in West Africa, with over {tribe_info['population']}. They are found across {tribe_info['location']} and speak {tribe_info['language']}.
 
@@ -791,10 +806,10 @@ The Fula people have preserved their rich cultural heritage through generations,
 
 Would you like to learn more about Fula music and instruments, their traditional ceremonies, or the role of griots in their society?"""
 
-    # Check for countries
-    elif any(word in input_lower for word in ["senegal", "gambia"]):
-        country_info = CULTURAL_KNOWLEDGE["countries"][word]
-        return f"""Ah, the {country_info['name']}! Let me share with you the rich cultural heritage and traditions of this African country...
+def _render_country(country_key: str) -> str:
+    """A country's tribes, languages and culture"""
+    country_info = CULTURAL_KNOWLEDGE["countries"][country_key]
+    return f"""Ah, the {country_info['name']}! Let me share with you the rich cultural heritage and traditions of this African country...
 
 **Tribes:**
 {', '.join(country_info['tribes'])}
@@ -809,6 +824,68 @@ The {country_info['name']} is known for its rich cultural diversity, traditional
 
 Would you like to learn more about the daily life in this country or its cultural traditions?"""
 
+# Intents of the cultural answers, in priority order
+CULTURAL_INTENTS = [
+    {"intent": "sundiata_keita", "any": ["sundiata", "keita", "sundiata keita"]},
+    {"intent": "dawda_jawara", "any": ["dawda", "jawara", "dawda jawara", "sir dawda"]},
+    {"intent": "mansa_musa", "any": ["mansa musa", "mansa"]},
+    {"intent": "kunta_kinteh", "any": ["kunta kinteh", "kunta"]},
+    {"intent": "senegal_tribes", "any": ["tribes in senegal", "senegalese tribes", "senegal tribes"]},
+    {"intent": "gambia_languages", "any": ["languages in gambia", "gambian languages", "gambia languages"]},
+    {"intent": "ubuntu", "any": ["ubuntu", "philosophy", "community"]},
+    {"intent": "griots", "any": ["griot", "storyteller", "oral", "tradition"]},
+    {"intent": "proverbs", "any": ["proverb", "wisdom", "sayings"]},
+    {"intent": "empires", "any": ["empire", "mali", "ghana", "songhai", "kingdom"]},
+    {"intent": "languages", "any": ["language", "swahili", "yoruba", "zulu"]},
+    {"intent": "arts", "any": ["art", "music", "dance", "culture"]},
+    {"intent": "mandinka", "any": ["mandinka", "mandingo", "mandinka tribe"]},
+    {"intent": "yoruba", "any": ["yoruba", "yoruba tribe", "yoruba people"]},
+    {"intent": "zulu", "any": ["zulu", "zulu tribe", "zulu people"]},
+    {"intent": "fula", "any": ["fula", "fulani"]},
+    {"intent": "senegal", "any": ["senegal"]},
+    {"intent": "gambia", "any": ["gambia"]}
+]
+cultural_router = IntentRouter(CULTURAL_INTENTS)
+
+_CULTURAL_RENDERERS = {
+    "sundiata_keita": _render_sundiata_keita,
+    "dawda_jawara": _render_dawda_jawara,
+    "mansa_musa": _render_mansa_musa,
+    "kunta_kinteh": _render_kunta_kinteh,
+    "senegal_tribes": _render_senegal_tribes,
+    "gambia_languages": _render_gambia_languages,
+    "ubuntu": _render_ubuntu,
+    "griots": _render_griots,
+    "proverbs": _render_proverbs,
+    "empires": _render_empires,
+    "languages": _render_languages,
+    "arts": _render_arts,
+    "mandinka": _render_mandinka,
+    "yoruba": _render_yoruba,
+    "zulu": _render_zulu,
+    "fula": _render_fula,
+    "senegal": lambda: _render_country("senegal"),
+    "gambia": lambda: _render_country("gambia")
+}
+
+# Answers picked at random on each call; every other answer is fixed and rendered once at load
+DYNAMIC_CULTURAL_INTENTS = {"proverbs"}
+_PRERENDERED_CULTURAL_RESPONSES = {
+    intent: render() for intent, render in _CULTURAL_RENDERERS.items() if intent not in DYNAMIC_CULTURAL_INTENTS
+}
+
+def get_cultural_response(user_input: str) -> str:
+    """
+    Enhanced cultural response function with better context awareness
+    """
+    input_lower = user_input.lower()
+    
+    intent = cultural_router.route(input_lower)
+    if intent in _PRERENDERED_CULTURAL_RESPONSES:
+        return _PRERENDERED_CULTURAL_RESPONSES[intent]
+    if intent:
+        return _CULTURAL_RENDERERS[intent]()
+
     # Default response with cultural warmth
     default_responses = FALLBACK_RESPONSES["default"]
     
@@ -830,6 +907,42 @@ What would you like to explore about African culture, history, or wisdom?"""
     
     return f"{random.choice(default_responses)} I am here to share the wisdom of our ancestors and help you learn about the rich cultural heritage of Africa. What specific aspect of African culture, history, or wisdom would you like to explore?"
 
+def generate_text(prompt: str, max_new_tokens: int = 200, max_sentences: Optional[int] = None,
+                  stop_at_question: bool = False, on_generated: Optional[Callable[[int], None]] = None,
+                  **generate_kwargs) -> Optional[str]:
+    """
+    Continue a prompt with the loaded model under the decode-time repetition controls.
+    Returns only the generated text, or None if no model is loaded or only the fallback
+    model is, which is not used for generation. on_generated receives the number of tokens
+    generated.
+    """
+    tokenizer = get_tokenizer()
+    model = get_model()
+    if tokenizer is None or model is None or _using_fallback:
+        return None
+    
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    settings = decode_settings(**generate_kwargs)
+    
+    def run_generation():
+        inputs = tokenizer(prompt, return_tensors="pt").to(device)
+        prompt_length = inputs["input_ids"].shape[1]
+        criteria = stopping_criteria(tokenizer, prompt_length, max_sentences, stop_at_question)
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            stopping_criteria=criteria,
+            **settings
+        )
+        if on_generated is not None:
+            on_generated(len(outputs[0]) - prompt_length)
+        text = tokenizer.decode(outputs[0][prompt_length:], skip_special_tokens=True)
+        return criteria[0].finished_text(text) if criteria else text
+    
+    # Identical generations in flight at the same time share one run
+    key = (prompt, max_new_tokens, max_sentences, stop_at_question, tuple(sorted(settings.items())))
+    return generation_flight.do(key, run_generation)
+
 def generate_response(prompt):
     """Generate response with proper error handling and timeout"""
     try:
@@ -843,6 +956,8 @@ def generate_response(prompt):
         if KNOWLEDGE_RETRIEVAL_AVAILABLE:
             with st.spinner("Searching for the latest information about Africa..."):
                 enhanced_knowledge = get_enhanced_african_knowledge(user_input)
+            for warning in retrieval_warnings(enhanced_knowledge):
+                st.warning(warning)
                 
             if enhanced_knowledge and (enhanced_knowledge.get('wikipedia') or enhanced_knowledge.get('web_results')):
                 formatted_response = format_knowledge_response(enhanced_knowledge)
@@ -856,9 +971,6 @@ def generate_response(prompt):
         if tokenizer is None or model is None:
             return "Sorry, I'm having trouble loading my model. Please try refreshing the page."
         
-        # Check if CUDA is available, otherwise use CPU
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        
         if _using_fallback:
             # For fallback model, use direct cultural responses instead of generation
             return get_cultural_response(user_input)
@@ -867,17 +979,18 @@ def generate_response(prompt):
             start_time = time.time()
             timeout = 30  # 30 second timeout
             
-            inputs = tokenizer(prompt, return_tensors="pt").to(device)
-            outputs = model.generate(**inputs, max_new_tokens=200)
+            budget = length_policy.predict(user_input)
+            response = generate_text(
+                prompt, on_generated=lambda tokens: length_policy.record(budget, tokens), **budget.generate_kwargs()
+            )
             
             # Check if generation took too long
             if time.time() - start_time > timeout:
                 st.warning("Model generation took too long, using fallback response.")
                 return get_cultural_response(user_input)
             
-            response = tokenizer.decode(outputs[0], skip_special_tokens=True)
             # Extract only the assistant's response
-            if "BintaBot:" in response:
+            if response and "BintaBot:" in response:
                 response = response.split("BintaBot:")[-1].strip()
             
             return response if response else "I understand your question. Let me share some African wisdom with you."
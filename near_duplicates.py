@@ -0,0 +1,116 @@
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"\w+")
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+# Documents (ingested chunks) whose 64-bit fingerprints differ in at most this many bits are near-duplicates
+MAX_DISTANCE = 3
+# Sentences and snippets have few words, so one changed word moves their fingerprint further. Measured
+# on sentence pairs: restatements differing in a function word mostly land within 4 bits, while fewer
+# than 1 in 400 sentences sharing a template but naming a different place, person or date come this close
+SHORT_TEXT_MAX_DISTANCE = 5
+
+# Words that carry the grammar of a sentence rather than its content
+FUNCTION_WORDS = {
+    "a", "about", "all", "also", "an", "and", "are", "as", "at", "be", "been", "but", "by", "can", "could",
+    "did", "do", "does", "for", "from", "had", "has", "have", "i", "in", "into", "is", "it", "its", "like",
+    "more", "my", "of", "on", "or", "our", "so", "some", "than", "that", "the", "their", "them", "there",
+    "these", "they", "this", "to", "very", "was", "we", "were", "will", "with", "would", "you", "your"
+}
+# Vote weights of SimHash features: content words decide the fingerprint, so swapping the name in a
+# shared template moves it far; function words and adjacent word pairs (which keep word order) weigh less
+CONTENT_WORD_WEIGHT = 4
+FUNCTION_WORD_WEIGHT = 1
+WORD_PAIR_WEIGHT = 1
+
+def _feature_hash(feature: str) -> int:
+    """Stable 64-bit hash of one feature"""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash fingerprint over the words and adjacent word pairs of a text, content words
+    weighing most
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return 0
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    weights = np.array(
+        [FUNCTION_WORD_WEIGHT if word in FUNCTION_WORDS else CONTENT_WORD_WEIGHT for word in words]
+        + [WORD_PAIR_WEIGHT] * (len(words) - 1)
+    )
+    hashes = np.fromiter((_feature_hash(feature) for feature in features), dtype=np.uint64, count=len(features))
+    # Each bit is set if the features having it set outweigh those that do not
+    votes = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int64).T @ weights
+    fingerprint = 0
+    for bit in np.flatnonzero(votes * 2 > weights.sum()):
+        fingerprint |= 1 << int(bit)
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin(a ^ b).count("1")
+
+class NearDuplicateIndex:
+    """
+    Index of SimHash fingerprints answering "is there a near-duplicate of this text?" in constant time.
+    The fingerprint is cut into max_distance + 1 bands; two fingerprints within max_distance bits
+    must agree on at least one band, so only fingerprints sharing a band are compared.
+    With max_size set, the least recently matched fingerprints are forgotten beyond that many.
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE, max_size: Optional[int] = None):
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self._band_bits = 64 // (max_distance + 1)
+        self._band_mask = (1 << self._band_bits) - 1
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(max_distance + 1)]
+        self._recent: OrderedDict = OrderedDict()
+        self.size = 0
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        """Value of each band of a fingerprint"""
+        return [fingerprint >> (band * self._band_bits) & self._band_mask for band in range(len(self._bands))]
+
+    def find(self, text: str) -> Optional[int]:
+        """Fingerprint of an indexed near-duplicate of text, or None"""
+        return self.find_fingerprint(simhash(text))
+
+    def find_fingerprint(self, fingerprint: int) -> Optional[int]:
+        """Indexed fingerprint within max_distance bits of fingerprint, or None"""
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for candidate in self._bands[band].get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    self._recent.move_to_end(candidate)
+                    return candidate
+        return None
+
+    def _evict_oldest(self):
+        """Forget the least recently matched fingerprint"""
+        fingerprint, _ = self._recent.popitem(last=False)
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            bucket = self._bands[band][key]
+            bucket.remove(fingerprint)
+            if not bucket:
+                del self._bands[band][key]
+        self.size -= 1
+
+    def add(self, text: str) -> bool:
+        """
+        Index text unless it near-duplicates something already indexed. Returns True if it was new.
+        """
+        fingerprint = simhash(text)
+        if self.find_fingerprint(fingerprint) is not None:
+            return False
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            self._bands[band].setdefault(key, []).append(fingerprint)
+        self._recent[fingerprint] = None
+        self.size += 1
+        if self.max_size is not None and self.size > self.max_size:
+            self._evict_oldest()
+        return True
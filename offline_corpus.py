@@ -0,0 +1,120 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# Local store built by ingest_wikipedia_dump.py
+OFFLINE_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "offline_wikipedia.sqlite3")
+
+# Share of the meaningful query terms a chunk must contain to count as a hit
+MIN_TERM_COVERAGE = 0.5
+
+# Words that carry no topic on their own (every page in the store is about Africa)
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'about', 'can', 'did', 'do', 'does', 'for', 'from', 'how', 'i',
+    'in', 'is', 'it', 'me', 'more', 'of', 'on', 'or', 'please', 'tell', 'the', 'their', 'to',
+    'was', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you', 'africa', 'african'
+}
+
+def _query_terms(query: str) -> List[str]:
+    """Meaningful lowercase terms of a query"""
+    terms = []
+    for word in re.findall(r"\w+", query.lower()):
+        if len(word) > 1 and word not in _STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+class OfflineCorpus:
+    """
+    Full-text store of pre-filtered Wikipedia chunks, searched in-process before going online
+    """
+
+    def __init__(self, path: str = OFFLINE_CORPUS_PATH):
+        self.path = path
+        self._db = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _close(self):
+        """Close the open connection, if any (lock held)"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _connect(self):
+        """Open the store, reopening it when a new ingest has replaced the file (lock held)"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._close()
+            return None
+        if self._db is None or mtime != self._mtime:
+            self._close()
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._mtime = mtime
+        return self._db
+
+    @staticmethod
+    def create(path: str) -> sqlite3.Connection:
+        """Create an empty store at path and return a writable connection to it"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path)
+        db.execute("CREATE VIRTUAL TABLE chunks USING fts5(title, content, url UNINDEXED, chunk UNINDEXED)")
+        return db
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict]:
+        """
+        Find the best chunk of the top_k most relevant pages, as {title, snippet, url}
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return []
+            rows = db.execute(
+                "SELECT title, content, url FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks, 5.0, 1.0) LIMIT ?",
+                (" OR ".join(f'"{term}"' for term in terms), top_k * 10)
+            ).fetchall()
+
+        results = []
+        seen_titles = set()
+        for title, content, url in rows:
+            if title in seen_titles:
+                continue
+            words = set(re.findall(r"\w+", f"{title} {content}".lower()))
+            if sum(1 for term in terms if term in words) < MIN_TERM_COVERAGE * len(terms):
+                continue
+            seen_titles.add(title)
+            results.append({"title": title, "snippet": content, "url": url})
+            if len(results) >= top_k:
+                break
+        return results
+
+    def get_page(self, title: str) -> Optional[Dict]:
+        """
+        Reassemble a stored page from its chunks
+        """
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            rows = db.execute(
+                "SELECT title, content, url, chunk FROM chunks WHERE chunks MATCH ?",
+                (f'title:"{title.replace(chr(34), "")}"',)
+            ).fetchall()
+
+        chunks = sorted((int(chunk), content, url) for row_title, content, url, chunk in rows if row_title == title)
+        if not chunks:
+            return None
+        return {
+            "title": title,
+            "content": "\n\n".join(content for _, content, _ in chunks),
+            "url": chunks[0][2]
+        }
+
+# Global offline corpus instance
+offline_corpus = OfflineCorpus()
@@ -1,9 +1,31 @@
 import streamlit as st
 from typing import List, Dict, Tuple
 import re
+import numpy as np
 from model import CULTURAL_KNOWLEDGE, FALLBACK_RESPONSES
 import random
 
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Queries are scored in blocks so a large batch never materializes one huge matrix
+SEARCH_BATCH_SIZE = 1024
+
+# Words that say nothing about what a query is after; match_scores ignores them so a query only
+# counts as a local match through its content words (every chunk is about Africa, so those
+# words carry no signal either)
+MATCH_STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "been", "but", "by", "can", "could",
+    "describe", "did", "do", "does", "explain", "for", "from", "give", "had", "has", "have", "how", "i",
+    "in", "into", "is", "it", "its", "know", "like", "me", "more", "my", "of", "on", "or", "our", "please",
+    "s", "should", "so", "some", "tell", "than", "that", "the", "their", "them", "there", "these", "they",
+    "this", "to", "was", "we", "were", "what", "when", "where", "which", "who", "whom", "why", "will",
+    "with", "would", "you", "your", "africa", "african", "africans"
+}
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for both chunk indexing and query matching"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
 class AfricanRAGSystem:
     """
     Simple RAG system for African cultural knowledge
@@ -11,6 +33,7 @@ class AfricanRAGSystem:
     
     def __init__(self):
         self.knowledge_chunks = self._create_knowledge_chunks()
+        self._build_term_index()
     
     def _create_knowledge_chunks(self) -> List[Dict]:
         """
@@ -256,47 +279,106 @@ class AfricanRAGSystem:
         
         return chunks
     
-    def search_knowledge(self, query: str, top_k: int = 3) -> List[Dict]:
+    def _build_term_index(self):
         """
-        Search knowledge chunks with improved diversity to reduce duplication
+        Build the term matrices used to score queries against every chunk at once
         """
-        query_lower = query.lower()
-        scored_chunks = []
+        vocab = {}
+        keyword_entries = []
+        self._max_phrase_len = 1
         
-        for chunk in self.knowledge_chunks:
-            score = 0
-            
-            # Check for exact keyword matches
-            for keyword in chunk["keywords"]:
-                if keyword in query_lower:
-                    score += 3
-                    
-            # Check for partial matches
-            for keyword in chunk["keywords"]:
-                if any(word in query_lower for word in keyword.split()):
-                    score += 1
-                    
-            # Check content relevance
-            content_lower = chunk["content"].lower()
-            if any(word in content_lower for word in query_lower.split()):
-                score += 2
-                
-            # Boost score for exact name matches
-            if any(word in query_lower for word in chunk["content"].split()[:3]):
-                score += 5
-                
-            if score > 0:
-                scored_chunks.append((score, chunk))
+        def term_id(term):
+            if term not in vocab:
+                vocab[term] = len(vocab)
+            return vocab[term]
         
-        # Sort by score and get top results
-        scored_chunks.sort(key=lambda x: x[0], reverse=True)
+        for chunk_idx, chunk in enumerate(self.knowledge_chunks):
+            for keyword in chunk["keywords"]:
+                tokens = _tokenize(keyword)
+                if not tokens:
+                    continue
+                self._max_phrase_len = max(self._max_phrase_len, len(tokens))
+                keyword_entries.append((chunk_idx, term_id(" ".join(tokens)), [term_id(token) for token in tokens]))
+            for token in _tokenize(chunk["content"]):
+                term_id(token)
+        
+        num_terms = len(vocab)
+        num_chunks = len(self.knowledge_chunks)
+        
+        # Exact keyword phrase counts, word membership per keyword and keyword ownership
+        self._keyword_phrases = np.zeros((num_terms, num_chunks), dtype=np.float32)
+        self._keyword_words = np.zeros((num_terms, len(keyword_entries)), dtype=np.float32)
+        self._keyword_owner = np.zeros((len(keyword_entries), num_chunks), dtype=np.float32)
+        for entry_idx, (chunk_idx, phrase_id, word_ids) in enumerate(keyword_entries):
+            self._keyword_phrases[phrase_id, chunk_idx] += 1
+            self._keyword_words[word_ids, entry_idx] = 1
+            self._keyword_owner[entry_idx, chunk_idx] = 1
+        
+        # Content terms and the leading (name) terms of each chunk
+        self._content_terms = np.zeros((num_terms, num_chunks), dtype=np.float32)
+        self._head_terms = np.zeros((num_terms, num_chunks), dtype=np.float32)
+        for chunk_idx, chunk in enumerate(self.knowledge_chunks):
+            content_ids = [vocab[token] for token in _tokenize(chunk["content"])]
+            self._content_terms[content_ids, chunk_idx] = 1
+            head_ids = [vocab[token] for word in chunk["content"].split()[:3] for token in _tokenize(word)]
+            self._head_terms[head_ids, chunk_idx] = 1
+        
+        self._vocab = vocab
+        # Rarity of each term across chunks (content and keywords); a word no chunk has is the
+        # rarest of all
+        in_chunk = (self._content_terms + self._keyword_words @ self._keyword_owner) > 0
+        self._unknown_weight = float(np.log(num_chunks + 1) + 1)
+        self._term_weights = np.log((num_chunks + 1) / (in_chunk.sum(axis=1) + 1)) + 1
+    
+    def _vectorize_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Turn queries into a binary query-term matrix over the chunk vocabulary
+        """
+        query_matrix = np.zeros((len(queries), len(self._vocab)), dtype=np.float32)
+        for row, query in enumerate(queries):
+            tokens = _tokenize(query)
+            for start in range(len(tokens)):
+                for length in range(1, self._max_phrase_len + 1):
+                    if start + length > len(tokens):
+                        break
+                    term = self._vocab.get(" ".join(tokens[start:start + length]))
+                    if term is not None:
+                        query_matrix[row, term] = 1
+        return query_matrix
+    
+    def _score_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Score every chunk for every query in one pass of matrix products
+        """
+        return self._score_matrix(self._vectorize_queries(queries))
+    
+    def _score_matrix(self, query_matrix: np.ndarray) -> np.ndarray:
+        """
+        Chunk scores for a query-term matrix
+        """
+        # Exact keyword matches
+        scores = 3 * (query_matrix @ self._keyword_phrases)
+        # Partial matches: keywords sharing any word with the query
+        scores += (query_matrix @ self._keyword_words > 0).astype(np.float32) @ self._keyword_owner
+        # Content relevance
+        scores += 2 * (query_matrix @ self._content_terms > 0)
+        # Boost for exact name matches
+        scores += 5 * (query_matrix @ self._head_terms > 0)
+        
+        return scores
+    
+    def _select_diverse_chunks(self, chunk_scores: np.ndarray, top_k: int) -> List[Dict]:
+        """
+        Pick the top chunks for one query while preferring different topics and categories
+        """
+        ranked = [idx for idx in np.argsort(-chunk_scores, kind="stable") if chunk_scores[idx] > 0]
         
         # Apply diversity filtering to reduce similar chunks
         diverse_chunks = []
         seen_topics = set()
-        seen_categories = set()
         
-        for score, chunk in scored_chunks[:top_k * 2]:  # Get more candidates for diversity
+        for idx in ranked[:top_k * 2]:  # Get more candidates for diversity
+            chunk = self.knowledge_chunks[idx]
             # Prefer chunks from different topics and categories
             topic_key = chunk["topic"]
             category = chunk["category"]
@@ -312,7 +394,8 @@ class AfricanRAGSystem:
         
         # If we don't have enough diverse chunks, add some more
         if len(diverse_chunks) < top_k:
-            for score, chunk in scored_chunks:
+            for idx in ranked:
+                chunk = self.knowledge_chunks[idx]
                 if chunk not in diverse_chunks:
                     diverse_chunks.append(chunk)
                     if len(diverse_chunks) >= top_k:
@@ -320,6 +403,47 @@ class AfricanRAGSystem:
         
         return diverse_chunks[:top_k]
     
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+        """
+        Search knowledge chunks for a batch of queries, returning the top chunks per query
+        """
+        results = []
+        for start in range(0, len(queries), SEARCH_BATCH_SIZE):
+            batch = queries[start:start + SEARCH_BATCH_SIZE]
+            scores = self._score_queries(batch)
+            for row in range(len(batch)):
+                results.append(self._select_diverse_chunks(scores[row], top_k))
+        return results
+    
+    def match_scores(self, queries: List[str]) -> np.ndarray:
+        """
+        Share of each query's content words (stopwords dropped) that the knowledge base knows,
+        weighted by rarity: 1 when it knows them all, 0 when it knows none. A query whose rare
+        words are unknown ("capital of Peru") scores low even if a common one matches.
+        """
+        scores = np.zeros(len(queries), dtype=np.float32)
+        for row, query in enumerate(queries):
+            words = set()
+            for word in _tokenize(query):
+                # "proverbs" matches a knowledge base that only says "proverb"
+                if word not in self._vocab and word.endswith("s") and word[:-1] in self._vocab:
+                    word = word[:-1]
+                if word not in MATCH_STOPWORDS:
+                    words.add(word)
+            weights = [
+                self._term_weights[self._vocab[word]] if word in self._vocab else self._unknown_weight
+                for word in words
+            ]
+            known = sum(weight for word, weight in zip(words, weights) if word in self._vocab)
+            scores[row] = known / sum(weights) if weights else 0.0
+        return scores
+    
+    def search_knowledge(self, query: str, top_k: int = 3) -> List[Dict]:
+        """
+        Search knowledge chunks with improved diversity to reduce duplication
+        """
+        return self.search_many([query], top_k)[0]
+    
     def generate_rag_response(self, query: str, chat_history: List[Dict] = None) -> str:
         """
         Generate response using RAG with cultural warmth
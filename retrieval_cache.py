@@ -0,0 +1,257 @@
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+# On-disk cache location, kept next to the app so it survives restarts
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "retrieval_cache.sqlite3")
+
+# Default freshness: entries are fresh for CACHE_TTL and may be served stale for MAX_STALE after that
+CACHE_TTL = 6 * 60 * 60
+MAX_STALE = 7 * 24 * 60 * 60
+MEMORY_CACHE_SIZE = 512
+
+# Query counts are buffered in memory and written in one batch, in the background, once this
+# many distinct queries are waiting or the oldest has waited QUERY_LOG_FLUSH_INTERVAL seconds
+QUERY_LOG_BATCH = 100
+QUERY_LOG_FLUSH_INTERVAL = 30.0
+
+def normalize_key(text: str) -> str:
+    """Normalize a query or title so trivially different spellings share an entry"""
+    return " ".join(re.findall(r"\w+", str(text).lower()))
+
+class RetrievalCache:
+    """
+    Two-tier cache for online retrieval results: an in-process LRU in front of SQLite.
+    Expired entries are served immediately while a background refresh fetches a new value.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, memory_size: int = MEMORY_CACHE_SIZE, max_stale: float = MAX_STALE):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_stale = max_stale
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # Query counts not yet written: key -> [query, hits, last_seen]
+        self._pending_queries = {}
+        self._pending_since = None
+        self._flush_scheduled = False
+        self._query_lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, stored_at REAL, expires_at REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_log ("
+                "key TEXT PRIMARY KEY, query TEXT, hits INTEGER, last_seen REAL)"
+            )
+            # Named leases let one of the processes sharing this file do a periodic job
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, expires_at REAL)"
+            )
+            # Drop entries too old to be served even as stale
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - max_stale,))
+            self._db.commit()
+
+    def get(self, namespace: str, key: str, fresh_for: float = 0) -> Optional[Tuple[Any, bool]]:
+        """
+        Look up an entry, returning (value, is_fresh) or None if it is absent or too stale.
+        An entry only counts as fresh if it stays fresh for another fresh_for seconds.
+        """
+        cache_key = (namespace, normalize_key(key))
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(cache_key)
+            if entry is not None:
+                self._memory.move_to_end(cache_key)
+            else:
+                row = self._db.execute(
+                    "SELECT value, stored_at, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                    cache_key
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (json.loads(row[0]), row[1], row[2])
+                self._remember(cache_key, entry)
+
+        value, _, expires_at = entry
+        if now > expires_at + self.max_stale:
+            return None
+        return value, now + fresh_for <= expires_at
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float = CACHE_TTL):
+        """
+        Store a JSON-serializable value in both tiers
+        """
+        cache_key = (namespace, normalize_key(key))
+        now = time.time()
+        entry = (value, now, now + ttl)
+
+        with self._lock:
+            self._remember(cache_key, entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (*cache_key, json.dumps(value), now, now + ttl)
+            )
+            self._db.commit()
+
+    def get_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Any], ttl: float = CACHE_TTL,
+                     should_cache: Callable[[Any], bool] = None) -> Any:
+        """
+        Serve fresh entries directly, stale entries immediately with a background refresh,
+        and misses by calling fetch(). Stale entries keep being served while refreshes fail.
+        """
+        cached = self.get(namespace, key)
+        if cached is not None:
+            value, is_fresh = cached
+            if not is_fresh:
+                self._refresh_in_background(namespace, key, fetch, ttl, should_cache)
+            return value
+
+        return self._fetch_and_store(namespace, key, fetch, ttl, should_cache)
+
+    def refresh(self, namespace: str, key: str, fetch: Callable[[], Any], ttl: float = CACHE_TTL,
+                should_cache: Callable[[Any], bool] = None) -> Any:
+        """
+        Call fetch() now and cache the result if it is usable, whatever is cached already
+        """
+        return self._fetch_and_store(namespace, key, fetch, ttl, should_cache)
+
+    def expiring(self, namespace: str, within: float = 0) -> List[Tuple[str, Any]]:
+        """
+        (key, value) of the entries in namespace that are stale or will be within the next within seconds
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM cache WHERE namespace = ? AND expires_at <= ?",
+                (namespace, time.time() + within)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def record_query(self, query: str):
+        """
+        Count a user query so the most asked ones can be kept warm. Counting stays in memory; the
+        counts reach the database in batches off the request path.
+        """
+        key = normalize_key(query)
+        if not key:
+            return
+        now = time.time()
+        with self._query_lock:
+            entry = self._pending_queries.get(key)
+            if entry is None:
+                self._pending_queries[key] = [query, 1, now]
+            else:
+                entry[0], entry[1], entry[2] = query, entry[1] + 1, now
+            if self._pending_since is None:
+                self._pending_since = now
+            due = len(self._pending_queries) >= QUERY_LOG_BATCH or now - self._pending_since >= QUERY_LOG_FLUSH_INTERVAL
+            if not due or self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._refresh_executor.submit(self.flush_queries)
+
+    def flush_queries(self):
+        """Write the buffered query counts in one transaction"""
+        with self._query_lock:
+            pending, self._pending_queries = self._pending_queries, {}
+            self._pending_since = None
+            self._flush_scheduled = False
+        if not pending:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO query_log (key, query, hits, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET query = excluded.query, hits = hits + excluded.hits, "
+                "last_seen = excluded.last_seen",
+                [(key, query, hits, last_seen) for key, (query, hits, last_seen) in pending.items()]
+            )
+            self._db.commit()
+
+    def top_queries(self, limit: int, max_age: float = MAX_STALE) -> List[str]:
+        """
+        The most asked queries seen within max_age seconds, most frequent first
+        """
+        self.flush_queries()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT query FROM query_log WHERE last_seen >= ? ORDER BY hits DESC, last_seen DESC LIMIT ?",
+                (time.time() - max_age, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_lease(self, name: str, holder: str, duration: float) -> bool:
+        """
+        Claim a lease shared by every process using this cache for duration seconds. True if
+        holder now has it, because it was free, had expired or was already holder's.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                claimed = self._db.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE leases.expires_at <= ? OR leases.holder = excluded.holder",
+                    (name, holder, now + duration, now)
+                ).rowcount == 1
+                self._db.commit()
+            except sqlite3.OperationalError:
+                # The database stayed locked by another process; it will be asked again later
+                self._db.rollback()
+                return False
+        return claimed
+
+    def _fetch_and_store(self, namespace, key, fetch, ttl, should_cache):
+        """Call fetch() and cache the result if it is usable"""
+        try:
+            value = fetch()
+        except Exception:
+            value = None
+        if value is not None and (should_cache is None or should_cache(value)):
+            self.set(namespace, key, value, ttl)
+        return value
+
+    def _refresh_in_background(self, namespace, key, fetch, ttl, should_cache):
+        """Refresh an expired entry once, off the request path"""
+        refresh_key = (namespace, normalize_key(key))
+        with self._lock:
+            if refresh_key in self._refreshing:
+                return
+            self._refreshing.add(refresh_key)
+
+        def refresh():
+            try:
+                self._fetch_and_store(namespace, key, fetch, ttl, should_cache)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(refresh_key)
+
+        self._refresh_executor.submit(refresh)
+
+    def _remember(self, cache_key, entry):
+        """Insert into the in-process LRU, evicting the least recently used entry (lock held)"""
+        self._memory[cache_key] = entry
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+# Global retrieval cache instance
+retrieval_cache = RetrievalCache()
+# Counts still buffered at shutdown are written rather than lost
+atexit.register(retrieval_cache.flush_queries)
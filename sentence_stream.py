@@ -0,0 +1,63 @@
+import re
+from typing import Iterable, Iterator, List
+from near_duplicates import NearDuplicateIndex, SHORT_TEXT_MAX_DISTANCE
+
+# A sentence is complete once whitespace follows its closing punctuation, or at a line break
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+class SentenceDeduplicator:
+    """
+    Incremental sentence deduplication. feed() takes text as it arrives (e.g. generated token
+    deltas) and returns the sentences it completed, whitespace-normalized, skipping exact and
+    near-duplicates of sentences already emitted; flush() returns the unfinished tail.
+    repeats counts the sentences dropped so far.
+    """
+
+    def __init__(self, max_distance: int = SHORT_TEXT_MAX_DISTANCE):
+        self._seen = NearDuplicateIndex(max_distance)
+        # Sentences already judged, so verbatim repeats skip fingerprinting
+        self._judged = set()
+        self._pending = ""
+        self.repeats = 0
+
+    def feed(self, delta: str) -> List[str]:
+        """Add text and return the new sentences it completed"""
+        self._pending += delta
+        parts = _SENTENCE_BREAK.split(self._pending)
+        # Only the unfinished last sentence stays buffered
+        self._pending = parts.pop()
+        return [sentence for sentence in map(self._accept, parts) if sentence]
+
+    def flush(self) -> List[str]:
+        """Emit whatever is left once the text has ended"""
+        sentence = self._accept(self._pending)
+        self._pending = ""
+        return [sentence] if sentence else []
+
+    def _accept(self, sentence: str) -> str:
+        """Normalized sentence if it is new, else an empty string"""
+        sentence = _WHITESPACE.sub(" ", sentence).strip()
+        if not sentence:
+            return ""
+        if sentence not in self._judged:
+            self._judged.add(sentence)
+            if self._seen.add(sentence):
+                return sentence
+        self.repeats += 1
+        return ""
+
+def dedup_stream(deltas: Iterable[str], max_distance: int = SHORT_TEXT_MAX_DISTANCE) -> Iterator[str]:
+    """
+    Yield the distinct sentences of a text stream as soon as each is complete, e.g. from a
+    transformers TextIteratorStreamer
+    """
+    deduplicator = SentenceDeduplicator(max_distance)
+    for delta in deltas:
+        yield from deduplicator.feed(delta)
+    yield from deduplicator.flush()
+
+def dedup_text(text: str, max_distance: int = SHORT_TEXT_MAX_DISTANCE) -> str:
+    """Distinct sentences of a complete text, joined by single spaces"""
+    deduplicator = SentenceDeduplicator(max_distance)
+    return " ".join(deduplicator.feed(text) + deduplicator.flush())
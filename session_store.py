@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Default on-disk session database, shared by every API worker on the host
+SESSION_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3")
+
+# Sessions expire this long after their last turn
+SESSION_TTL = 24 * 60 * 60
+# Largest stored state of one session; the oldest turns are dropped to stay under it
+MAX_SESSION_BYTES = 64 * 1024
+# Sessions kept by the in-memory store before the least recently used is evicted
+MAX_MEMORY_SESSIONS = 10000
+# The SQLite store deletes expired sessions once every this many saves
+PURGE_EVERY = 500
+
+def encode_state(state: Dict, max_bytes: int = MAX_SESSION_BYTES) -> str:
+    """
+    JSON for a session state, dropping its oldest turns until it fits in max_bytes
+    """
+    state = dict(state)
+    pending = list(state.get("unfolded", []))
+    turns = list(state.get("turns", []))
+    while True:
+        state["unfolded"], state["turns"] = pending, turns
+        payload = json.dumps(state, ensure_ascii=False)
+        if len(payload.encode("utf-8")) <= max_bytes or not (pending or turns):
+            return payload
+        if pending:
+            pending.pop(0)
+        else:
+            turns.pop(0)
+
+class SessionStore(ABC):
+    """
+    Conversation state per session id. Loading and saving touch one session only, so their
+    cost does not depend on how many sessions or workers there are.
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict]:
+        """State of a session, or None if it is unknown or expired"""
+
+    @abstractmethod
+    def save(self, session_id: str, state: Dict):
+        """Store the state of a session and restart its expiry clock"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget a session"""
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU of sessions, for a single API worker
+    """
+
+    def __init__(self, max_sessions: int = MAX_MEMORY_SESSIONS, ttl: float = SESSION_TTL,
+                 max_bytes: int = MAX_SESSION_BYTES):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if time.time() > expires_at:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+        return json.loads(payload)
+
+    def save(self, session_id: str, state: Dict):
+        payload = encode_state(state, self.max_bytes)
+        with self._lock:
+            self._sessions[session_id] = (payload, time.time() + self.ttl)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file, so several API worker processes can share conversations
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL, max_bytes: int = MAX_SESSION_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._saves = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Other worker processes may hold the write lock for a moment
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, state TEXT, expires_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+            self._db.commit()
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, state: Dict):
+        payload = encode_state(state, self.max_bytes)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, expires_at) VALUES (?, ?, ?)",
+                (session_id, payload, now + self.ttl)
+            )
+            self._saves += 1
+            if self._saves % PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            self._db.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+def session_store_from_env() -> SessionStore:
+    """
+    Pick the store from BINTABOT_SESSION_STORE: sqlite (default, shared by all workers) or memory.
+    BINTABOT_SESSION_DB overrides the SQLite file.
+    """
+    if os.environ.get("BINTABOT_SESSION_STORE", "sqlite").lower() == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(os.environ.get("BINTABOT_SESSION_DB", SESSION_DB_PATH))
+
+# Global session store instance
+session_store = session_store_from_env()
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs the function,
+    the others wait for it and share its result (or its exception)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is already in flight
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Later callers start a new call rather than reuse this result
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
@@ -6,7 +6,10 @@ import random
 # Import knowledge retrieval if available
 try:
     from knowledge_retriever import get_african_topic_suggestions
+    from cache_warmer import cache_warmer
     KNOWLEDGE_RETRIEVAL_AVAILABLE = True
+    # Keep popular topics cached in the background (started once per process)
+    cache_warmer.start()
 except ImportError:
     KNOWLEDGE_RETRIEVAL_AVAILABLE = False
 
@@ -275,7 +278,7 @@ def main():
         
         # New session button
         if st.button("New Session"):
-            st.session_state.chat_history = []
+            st.session_state.chat_history.clear()
             st.session_state.quick_question = ""
             st.rerun()
     
@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from answer_store import AnswerStore, refers_to_context
+
+
+def write_store(path, rows):
+    db = AnswerStore.create(path)
+    db.executemany("INSERT INTO answers (key, query, answer, answered_by, built_at) VALUES (?, ?, ?, ?, ?)", rows)
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize("query", ["Tell me more", "Who was his successor?", "What happened to them?", "yes, continue"])
+def test_refers_to_context(query):
+    assert refers_to_context(query)
+
+
+@pytest.mark.parametrize("query", ["Who is Mansa Musa?", "Tell me about the Mali Empire", "What is kente cloth?"])
+def test_standalone_queries_do_not_refer_to_context(query):
+    assert not refers_to_context(query)
+
+
+def test_lookup_ignores_answers_older_than_max_age(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    now = time.time()
+    write_store(path, [
+        ("who is mansa musa", "Who is Mansa Musa?", "Mansa Musa ruled Mali.", "rag", now - 60),
+        ("what is a griot", "What is a griot?", "A griot is a storyteller.", "rag", now - 3600),
+    ])
+    store = AnswerStore(path, max_age=600)
+    assert store.lookup("who is Mansa Musa") == "Mansa Musa ruled Mali."
+    assert store.lookup("What is a griot?") is None
+    assert store.lookup("Who is Sundiata?") is None
+
+
+def test_lookup_without_a_store(tmp_path):
+    assert AnswerStore(str(tmp_path / "missing.sqlite3")).lookup("Who is Mansa Musa?") is None
+
+
+def test_replaced_store_is_reopened_and_old_connection_closed(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    write_store(path, [("what is ubuntu", "What is Ubuntu?", "Old answer.", "rag", time.time())])
+    store = AnswerStore(path)
+    assert store.lookup("What is Ubuntu?") == "Old answer."
+    old_db = store._db
+
+    replacement = str(tmp_path / "answers.sqlite3.tmp")
+    write_store(replacement, [("what is ubuntu", "What is Ubuntu?", "New answer.", "rag", time.time())])
+    os.replace(replacement, path)
+    os.utime(path, (time.time() + 10, time.time() + 10))
+
+    assert store.lookup("What is Ubuntu?") == "New answer."
+    with pytest.raises(Exception):
+        old_db.execute("SELECT 1")
@@ -0,0 +1,52 @@
+import pytest
+
+# build_answer_store answers queries with the chat pipeline, which needs the model dependencies
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import build_answer_store
+from answer_store import AnswerStore
+from chat_pipeline import Pipeline, Stage
+
+
+def test_answer_queries_skip_context_references(monkeypatch):
+    monkeypatch.setattr(build_answer_store, "QUICK_ACTION_QUERIES", ["Who is Mansa Musa?"])
+    monkeypatch.setattr(build_answer_store, "get_african_topic_suggestions", lambda: ["who is mansa musa"])
+    monkeypatch.setattr(build_answer_store.retrieval_cache, "top_queries",
+                        lambda count: ["Tell me more", "What is kente cloth?", "Who was his successor?"])
+    assert build_answer_store.answer_queries() == ["Who is Mansa Musa?", "What is kente cloth?"]
+
+
+def test_build_replaces_the_store_only_once_complete(monkeypatch, tmp_path):
+    output = str(tmp_path / "answers.sqlite3")
+    answers = {"Who is Mansa Musa?": "Mansa Musa ruled Mali."}
+    monkeypatch.setattr(build_answer_store, "chat_pipeline", Pipeline(
+        [Stage("rag", lambda request, budget: answers.get(request["user_input"]))], fallback=lambda request: None
+    ))
+
+    stats = build_answer_store.build(["Who is Mansa Musa?", "What is kente cloth?"], output)
+    assert (stats["stored"], stats["unanswered"]) == (1, 1)
+    assert AnswerStore(output).lookup("Who is Mansa Musa?") == "Mansa Musa ruled Mali."
+
+    # A build that fails part way leaves the previous store in place
+    answers["What is kente cloth?"] = "Kente is woven in Ghana."
+    monkeypatch.setattr(build_answer_store.AnswerStore, "create", _failing_create(AnswerStore.create))
+    with pytest.raises(RuntimeError):
+        build_answer_store.build(["What is kente cloth?"], output)
+    assert AnswerStore(output).lookup("Who is Mansa Musa?") == "Mansa Musa ruled Mali."
+    assert AnswerStore(output).lookup("What is kente cloth?") is None
+
+
+def _failing_create(create):
+    def failing_create(path):
+        db = create(path)
+
+        class FailingConnection:
+            def execute(self, *args):
+                raise RuntimeError("disk full")
+
+            def __getattr__(self, name):
+                return getattr(db, name)
+
+        return FailingConnection()
+    return failing_create
@@ -0,0 +1,41 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chat_pipeline
+from chat_pipeline import Deadline, Pipeline, Stage
+
+
+def test_speculative_stages_are_cancelled_only_if_not_yet_running(monkeypatch):
+    # One speculation thread: the first speculative stage runs, the second waits in the queue
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(chat_pipeline, "_speculation_executor", executor)
+    running = threading.Event()
+    release = threading.Event()
+
+    def slow_speculation(request, budget):
+        running.set()
+        release.wait(5)
+        return "late answer"
+
+    def answer_once_speculation_runs(request, budget):
+        running.wait(5)
+        return "answer"
+
+    pipeline = Pipeline([
+        Stage("instant", lambda request, budget: None),
+        Stage("slow", answer_once_speculation_runs, cost=0.1),
+        Stage("running", slow_speculation, cost=0.1, speculate=lambda request: True),
+        Stage("queued", lambda request, budget: "unused", cost=0.1, speculate=lambda request: True),
+    ], fallback=lambda request: "fallback")
+
+    answer, trace = pipeline.run({}, Deadline(10))
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert (answer, trace["answered_by"]) == ("answer", "slow")
+    assert trace["speculated"] == ["running", "queued"]
+    assert trace["cancelled"] == ["queued"]
+    assert trace["abandoned"] == ["running"]
+    summary = pipeline.summary()
+    assert (summary["queued"]["cancelled"], summary["queued"]["abandoned"]) == (1, 0)
+    assert (summary["running"]["cancelled"], summary["running"]["abandoned"]) == (0, 1)
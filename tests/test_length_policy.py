@@ -0,0 +1,73 @@
+import pytest
+
+from length_policy import (
+    LengthPolicy, query_form, DEFAULT_FORM, LENGTH_HEADROOM, MAX_NEW_TOKENS, MIN_NEW_TOKENS, TOKEN_STEP
+)
+
+
+@pytest.mark.parametrize("query", ["Hello", "hi there!", "Good morning, BintaBot", "Thank you so much!", "jambo"])
+def test_bare_greetings_are_greetings(query):
+    assert query_form(query)[0] == "greeting"
+
+
+@pytest.mark.parametrize("query, form", [
+    ("Hello! Who is Mansa Musa?", "definition"),
+    ("thanks, why did Mali fall?", "explanation"),
+    ("Hi, tell me a story", "story"),
+    ("Hey, what is a griot?", "definition"),
+    ("Hello, Timbuktu manuscripts", "general"),
+])
+def test_greeting_followed_by_a_question_takes_the_question_form(query, form):
+    assert query_form(query)[0] == form
+
+
+def test_story_outranks_definition():
+    assert query_form("What is the legend of Sundiata?")[0] == "story"
+
+
+def test_unmatched_query_gets_default_form():
+    assert query_form("Kente cloth colours") == DEFAULT_FORM
+
+
+def test_predict_uses_form_default_until_enough_samples():
+    policy = LengthPolicy(min_samples=3)
+    budget = policy.predict("Who is Mansa Musa?", topic="history")
+    assert (budget.topic, budget.form, budget.max_new_tokens) == ("history", "definition", 160)
+    assert budget.max_sentences == 6 and budget.stop_at_question
+
+    policy.record(budget, 40)
+    policy.record(budget, 50)
+    assert policy.predict("Who is Mansa Musa?", topic="history").max_new_tokens == 160
+
+
+def test_predict_follows_recorded_lengths():
+    policy = LengthPolicy(min_samples=3)
+    budget = policy.predict("Why did Mali fall?", topic="history")
+    for tokens in (100, 120, 140):
+        policy.record(budget, tokens)
+
+    expected = -(-140 * LENGTH_HEADROOM // TOKEN_STEP) * TOKEN_STEP
+    assert policy.predict("How did Mali trade gold?", topic="history").max_new_tokens == expected
+    # History is kept per topic and form
+    assert policy.predict("Why did Mali fall?", topic="culture").max_new_tokens == 256
+    assert policy.stats()["history/explanation"] == {"answers": 3, "median_tokens": 120}
+
+
+def test_predict_clamps_to_bounds():
+    policy = LengthPolicy(min_samples=1)
+    budget = policy.predict("Tell me a story", topic="culture")
+    policy.record(budget, 5000)
+    assert policy.predict("Tell me a story", topic="culture").max_new_tokens == MAX_NEW_TOKENS
+
+    policy = LengthPolicy(min_samples=1)
+    budget = policy.predict("Hello", topic="general")
+    policy.record(budget, 1)
+    assert policy.predict("Hello", topic="general").max_new_tokens == MIN_NEW_TOKENS
+
+
+def test_history_is_bounded():
+    policy = LengthPolicy(history=3, min_samples=3)
+    budget = policy.predict("Kente cloth colours", topic="culture")
+    for tokens in (300, 300, 300, 48, 48, 48):
+        policy.record(budget, tokens)
+    assert policy.predict("Kente cloth colours", topic="culture").max_new_tokens == 64
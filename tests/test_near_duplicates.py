@@ -0,0 +1,47 @@
+import pytest
+
+from near_duplicates import NearDuplicateIndex, SHORT_TEXT_MAX_DISTANCE, hamming_distance, simhash
+from sentence_stream import dedup_text
+
+
+def test_index_bounded_by_max_size_forgets_least_recently_matched():
+    index = NearDuplicateIndex(max_size=2)
+    assert index.add("The Mali Empire was founded by Sundiata Keita in the thirteenth century")
+    assert index.add("Kente cloth is woven by the Ashanti and Ewe peoples of Ghana and Togo")
+    # A repeat refreshes the first text, so the kente text is the one forgotten next
+    assert not index.add("The Mali Empire was founded by Sundiata Keita in the thirteenth century")
+    assert index.add("Timbuktu held manuscripts on astronomy, law and medicine for centuries")
+    assert index.size == 2
+    assert index.find("The Mali Empire was founded by Sundiata Keita in the thirteenth century") is not None
+    assert index.find("Kente cloth is woven by the Ashanti and Ewe peoples of Ghana and Togo") is None
+
+
+@pytest.mark.parametrize("first, second", [
+    ("The Mali Empire was founded by Sundiata Keita.", "the Mali Empire was founded by Sundiata Keita!"),
+    ("Mansa Musa was one of the richest people in history.",
+     "Mansa Musa was one of the richest people in all of history."),
+    ("Kente cloth is woven by the Ashanti people of Ghana.", "Kente cloth is woven by the Ashanti people in Ghana."),
+    ("Griots are the keepers of oral history in West Africa, preserving genealogies and stories.",
+     "Griots are the keepers of oral history in West Africa, preserving the genealogies and stories."),
+])
+def test_restated_sentences_are_near_duplicates(first, second):
+    assert hamming_distance(simhash(first), simhash(second)) <= SHORT_TEXT_MAX_DISTANCE
+
+
+@pytest.mark.parametrize("first, second", [
+    ("The Mali Empire was founded in 1235.", "The Songhai Empire was founded in 1430."),
+    ("Mansa Musa ruled the Mali Empire.", "Sundiata Keita ruled the Mali Empire."),
+    ("Would you like to learn more about Mali?", "Would you like to learn more about Ethiopia?"),
+    ("The Yoruba people live in Nigeria.", "The Zulu people live in South Africa."),
+    ("It was founded in the 13th century.", "It was destroyed in the 16th century."),
+    ("Swahili is spoken in Kenya and Tanzania.", "Amharic is spoken in Ethiopia and Eritrea."),
+])
+def test_sentences_sharing_boilerplate_are_distinct(first, second):
+    assert hamming_distance(simhash(first), simhash(second)) > SHORT_TEXT_MAX_DISTANCE
+
+
+def test_dedup_text_keeps_templated_facts_and_drops_repeats():
+    text = ("The Mali Empire was founded in 1235. The Songhai Empire was founded in 1430. "
+            "The Kanem Empire was founded in 700. The Mali Empire was founded in 1235!")
+    assert dedup_text(text) == ("The Mali Empire was founded in 1235. The Songhai Empire was founded in 1430. "
+                                "The Kanem Empire was founded in 700.")
@@ -0,0 +1,27 @@
+import pytest
+
+# rag_system imports the model module, which needs the model dependencies
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from rag_system import rag_system
+from chatbot import RAG_SPECULATION_SCORE
+
+LOCAL_HITS = [
+    "Who is Mansa Musa?", "Tell me about the Mali Empire", "What is Ubuntu philosophy?",
+    "What is a griot?", "What is kente cloth?", "What are African proverbs?", "Tell me about Timbuktu"
+]
+LOCAL_MISSES = [
+    "How do I bake bread?", "Tell me about Nelson Mandela", "What is the capital of Peru?",
+    "How does a car engine work?", "Who won the World Cup in 2018?", "xyz qwerty"
+]
+
+def test_match_scores_separate_local_hits_from_misses():
+    hits = rag_system.match_scores(LOCAL_HITS)
+    misses = rag_system.match_scores(LOCAL_MISSES)
+    assert (hits >= RAG_SPECULATION_SCORE).all(), dict(zip(LOCAL_HITS, hits))
+    assert (misses < RAG_SPECULATION_SCORE).all(), dict(zip(LOCAL_MISSES, misses))
+
+def test_match_scores_ignore_stopwords():
+    assert rag_system.match_scores(["What is the", "Tell me about it"]).tolist() == [0.0, 0.0]
+    assert len(rag_system.match_scores([])) == 0
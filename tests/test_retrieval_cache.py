@@ -0,0 +1,23 @@
+from retrieval_cache import RetrievalCache
+
+
+def test_lease_is_held_by_one_process_until_it_expires(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    # Two caches on one file stand for two worker processes
+    first, second = RetrievalCache(path), RetrievalCache(path)
+    now = [1000.0]
+    monkeypatch.setattr("retrieval_cache.time.time", lambda: now[0])
+
+    assert first.claim_lease("cache_warmer", "host:1", 60)
+    assert not second.claim_lease("cache_warmer", "host:2", 60)
+    # The holder may renew its own lease
+    now[0] += 30
+    assert first.claim_lease("cache_warmer", "host:1", 60)
+    now[0] += 59
+    assert not second.claim_lease("cache_warmer", "host:2", 60)
+    # Once it expires another process takes it over
+    now[0] += 1
+    assert second.claim_lease("cache_warmer", "host:2", 60)
+    assert not first.claim_lease("cache_warmer", "host:1", 60)
+    # Leases are independent of each other
+    assert first.claim_lease("other_job", "host:1", 60)
@@ -0,0 +1,25 @@
+from topic_classifier import get_topic_classifier
+
+ROUTING_CONFIDENCE = 0.75
+
+def _is_uninformed(result):
+    topic, confidence = result
+    return topic == "general" and confidence < ROUTING_CONFIDENCE
+
+def test_predict_batch_ending_with_featureless_queries():
+    for batch in (["drums", ""], ["drums", "???"], ["drums", "", "?!"]):
+        results = get_topic_classifier().predict_batch(batch)
+        assert len(results) == len(batch)
+        assert results[0][0] == "music"
+        assert all(_is_uninformed(result) for result in results[1:])
+
+def test_predict_batch_with_only_featureless_queries():
+    results = get_topic_classifier().predict_batch(["", "...", "xyzzy"])
+    assert all(_is_uninformed(result) for result in results)
+    assert get_topic_classifier().predict_batch([]) == []
+
+def test_unknown_queries_get_the_prior_not_full_confidence():
+    classifier = get_topic_classifier()
+    empty, unknown = classifier.predict_batch(["", "xyzzy"])
+    assert empty == unknown
+    assert 0.0 < empty[1] < 0.5
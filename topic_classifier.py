@@ -0,0 +1,277 @@
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Labelled queries bundled with the app, one "topic<TAB>query" per line
+TOPIC_QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "topic_queries.tsv")
+
+TOPICS = [
+    "music", "history", "culture", "language", "tribe", "religion", "geography", "politics",
+    "education", "philosophy", "food", "art", "family", "trade", "medicine", "general"
+]
+
+# Topic keywords the old keyword matcher used, kept as one-word training examples
+TOPIC_KEYWORDS = {
+    "music": ["music", "song", "dance", "rhythm", "drum", "instrument", "melody", "beat", "mbalax", "afrobeat", "highlife"],
+    "history": ["history", "historical", "ancient", "empire", "kingdom", "dynasty", "century", "period", "past", "traditional"],
+    "culture": ["culture", "cultural", "tradition", "custom", "ceremony", "ritual", "festival", "celebration", "heritage"],
+    "language": ["language", "linguistic", "speak", "tongue", "dialect", "word", "proverb", "saying", "expression"],
+    "tribe": ["tribe", "ethnic", "people", "group", "community", "clan", "family", "lineage", "ancestry"],
+    "religion": ["religion", "spiritual", "belief", "faith", "god", "ancestor", "sacred", "divine", "worship", "prayer"],
+    "geography": ["country", "region", "land", "place", "location", "area", "territory", "border", "coast", "river"],
+    "politics": ["government", "leader", "president", "king", "queen", "chief", "ruler", "politics", "power", "authority"],
+    "education": ["learn", "teach", "school", "education", "knowledge", "wisdom", "study", "university", "academic"],
+    "philosophy": ["philosophy", "thought", "idea", "concept", "principle", "value", "belief", "wisdom", "understanding"],
+    "food": ["food", "cuisine", "dish", "meal", "cooking", "recipe", "ingredient", "spice", "flavor", "taste"],
+    "art": ["art", "craft", "sculpture", "painting", "design", "pattern", "beadwork", "textile", "pottery"],
+    "family": ["family", "elder", "parent", "child", "grandparent", "ancestor", "relative", "kinship", "respect"],
+    "trade": ["trade", "commerce", "market", "business", "economy", "wealth", "gold", "salt", "exchange"],
+    "medicine": ["medicine", "healing", "health", "traditional", "herb", "cure", "treatment", "wellness"]
+}
+
+# Size of the hashed feature space
+N_FEATURES = 2 ** 14
+
+# Words longer than this also contribute their prefix as a feature
+PREFIX_LENGTH = 4
+
+# Training settings for the softmax regression
+EPOCHS = 200
+LEARNING_RATE = 50.0
+L2_PENALTY = 1e-4
+CALIBRATION_FOLDS = 5
+
+# Softmax temperature fitted on cross-validated logits of the bundled query set. Cross-validation
+# is too slow to repeat on every start, so rerun `python topic_classifier.py` after changing the
+# data or features and copy the temperature it reports here
+CALIBRATED_TEMPERATURE = 1.1
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+def load_topic_queries(path: str = TOPIC_QUERIES_PATH) -> Tuple[List[str], List[str]]:
+    """Read the labelled query set as (queries, topics)"""
+    queries, topics = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            topic, query = line.rstrip("\n").split("\t", 1)
+            topics.append(topic)
+            queries.append(query)
+    return queries, topics
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Row-wise softmax"""
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+class TopicClassifier:
+    """
+    Softmax regression over hashed word unigram and bigram features, with temperature-calibrated confidence
+    """
+
+    def __init__(self, topics: List[str] = TOPICS, n_features: int = N_FEATURES):
+        self.topics = list(topics)
+        self.n_features = n_features
+        self.weights = np.zeros((n_features, len(self.topics)), dtype=np.float32)
+        self.bias = np.zeros(len(self.topics), dtype=np.float32)
+        self.temperature = 1.0
+        self._known_features = np.zeros(n_features, dtype=bool)
+        self._feature_ids = {}
+
+    def _feature_id(self, feature: str) -> int:
+        """Hashed column of a feature, memoized"""
+        feature_id = self._feature_ids.get(feature)
+        if feature_id is None:
+            feature_id = zlib.crc32(feature.encode("utf-8")) % self.n_features
+            if len(self._feature_ids) < 200000:
+                self._feature_ids[feature] = feature_id
+        return feature_id
+
+    def _features(self, query: str) -> List[int]:
+        """Hashed unigram, word-prefix and bigram features of a query"""
+        words = _TOKEN_PATTERN.findall(query.lower())
+        ids = [self._feature_id(word) for word in words]
+        # The prefix lets "drums" share weight with "drum" and "healers" with "healing"
+        ids.extend(self._feature_id(f"{word[:PREFIX_LENGTH]}*") for word in words if len(word) > PREFIX_LENGTH)
+        ids.extend(self._feature_id(f"{a} {b}") for a, b in zip(words, words[1:]))
+        return ids
+
+    def _encode(self, queries: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Flattened feature ids of all queries and each query's [start, end) offsets"""
+        ids = []
+        offsets = [0]
+        for query in queries:
+            ids.extend(self._features(query))
+            offsets.append(len(ids))
+        return np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+    def _logits(self, ids: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Sum the weight rows of each query's features, via prefix sums so empty queries work"""
+        prefix = np.zeros((len(ids) + 1, len(self.topics)), dtype=np.float32)
+        np.cumsum(self.weights[ids], axis=0, out=prefix[1:])
+        return prefix[offsets[1:]] - prefix[offsets[:-1]] + self.bias
+
+    def fit(self, queries: List[str], topics: List[str], epochs: int = EPOCHS,
+            learning_rate: float = LEARNING_RATE, l2_penalty: float = L2_PENALTY) -> "TopicClassifier":
+        """
+        Train with full-batch gradient descent on the cross-entropy loss
+        """
+        ids, offsets = self._encode(queries)
+        # Train on the columns that actually occur, then scatter them back into the hashed space
+        columns, local_ids = np.unique(ids, return_inverse=True)
+        rows = np.repeat(np.arange(len(queries)), np.diff(offsets))
+        targets = np.zeros((len(queries), len(self.topics)), dtype=np.float32)
+        targets[np.arange(len(queries)), [self.topics.index(topic) for topic in topics]] = 1
+        cells = (local_ids[:, None] * len(self.topics) + np.arange(len(self.topics))).ravel()
+
+        weights = np.zeros((len(columns), len(self.topics)), dtype=np.float32)
+        bias = np.zeros(len(self.topics), dtype=np.float32)
+        for _ in range(epochs):
+            prefix = np.zeros((len(ids) + 1, len(self.topics)), dtype=np.float32)
+            np.cumsum(weights[local_ids], axis=0, out=prefix[1:])
+            logits = prefix[offsets[1:]] - prefix[offsets[:-1]] + bias
+            errors = (_softmax(logits) - targets) / len(queries)
+            gradient = np.bincount(cells, weights=errors[rows].ravel(), minlength=weights.size)
+            weights -= learning_rate * (gradient.reshape(weights.shape) + l2_penalty * weights)
+            bias -= learning_rate * errors.sum(axis=0)
+
+        self.weights[:] = 0
+        self.weights[columns] = weights
+        self.bias[:] = bias
+        self._known_features[:] = False
+        self._known_features[columns] = True
+        return self
+
+    def calibrate(self, logits: np.ndarray, topics: List[str]):
+        """
+        Pick the softmax temperature that minimizes the log loss of held-out logits
+        """
+        labels = np.array([self.topics.index(topic) for topic in topics])
+        best = None
+        for temperature in np.linspace(0.2, 5.0, 97):
+            probabilities = _softmax(logits / temperature)
+            loss = -np.log(probabilities[np.arange(len(labels)), labels] + 1e-12).mean()
+            if best is None or loss < best[0]:
+                best = (loss, float(temperature))
+        self.temperature = best[1]
+
+    def predict_proba(self, queries: List[str]) -> np.ndarray:
+        """Calibrated topic probabilities, one row per query"""
+        ids, offsets = self._encode(queries)
+        return _softmax(self._logits(ids, offsets) / self.temperature)
+
+    def predict_batch(self, queries: List[str]) -> List[Tuple[str, float]]:
+        """
+        (topic, confidence) for each query. Queries with no feature seen in training are "general"
+        with the model's prior for it, so knowing nothing never reads as a confident answer.
+        """
+        ids, offsets = self._encode(queries)
+        probabilities = _softmax(self._logits(ids, offsets) / self.temperature)
+        best = probabilities.argmax(axis=1)
+        # Known features per query from prefix sums, which give 0 for queries without features
+        known_prefix = np.concatenate([[0], np.cumsum(self._known_features[ids])])
+        known = known_prefix[offsets[1:]] - known_prefix[offsets[:-1]]
+        general = self.topics.index("general")
+        return [
+            (self.topics[index], float(probabilities[row, index])) if known[row]
+            else ("general", float(probabilities[row, general]))
+            for row, index in enumerate(best)
+        ]
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        """(topic, confidence) of one query"""
+        return self.predict_batch([query])[0]
+
+def _seed_examples() -> Tuple[List[str], List[str]]:
+    """The keyword lexicon as one-word training examples"""
+    queries, topics = [], []
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        queries.extend(keywords)
+        topics.extend([topic] * len(keywords))
+    return queries, topics
+
+def _folds(count: int, folds: int) -> List[np.ndarray]:
+    """Deterministic interleaved fold assignment"""
+    order = np.random.RandomState(0).permutation(count)
+    return [order[fold::folds] for fold in range(folds)]
+
+def cross_validate(queries: List[str], topics: List[str], folds: int = CALIBRATION_FOLDS) -> np.ndarray:
+    """
+    Out-of-fold logits for every labelled query; the keyword seeds are always in the training part
+    """
+    seed_queries, seed_topics = _seed_examples()
+    logits = np.zeros((len(queries), len(TOPICS)), dtype=np.float32)
+    for held_out in _folds(len(queries), folds):
+        held = set(held_out.tolist())
+        train = [i for i in range(len(queries)) if i not in held]
+        model = TopicClassifier().fit(
+            [queries[i] for i in train] + seed_queries, [topics[i] for i in train] + seed_topics
+        )
+        ids, offsets = model._encode([queries[i] for i in held_out])
+        logits[held_out] = model._logits(ids, offsets)
+    return logits
+
+def keyword_topic(query: str) -> str:
+    """Topic with the most keyword substrings in the query, the matcher this classifier replaced"""
+    query_lower = query.lower()
+    scores = {topic: sum(1 for keyword in keywords if keyword in query_lower) for topic, keywords in TOPIC_KEYWORDS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] else "general"
+
+def evaluate(queries: Optional[List[str]] = None, topics: Optional[List[str]] = None) -> Dict:
+    """
+    Cross-validated accuracy and expected calibration error on the labelled query set
+    """
+    if queries is None:
+        queries, topics = load_topic_queries()
+    logits = cross_validate(queries, topics)
+    calibrated = TopicClassifier()
+    calibrated.calibrate(logits, topics)
+    probabilities = _softmax(logits / calibrated.temperature)
+    predicted = probabilities.argmax(axis=1)
+    confidence = probabilities.max(axis=1)
+    correct = predicted == np.array([TOPICS.index(topic) for topic in topics])
+
+    # Expected calibration error over 10 confidence bins
+    bins = np.minimum((confidence * 10).astype(int), 9)
+    ece = sum(
+        abs(correct[bins == b].mean() - confidence[bins == b].mean()) * (bins == b).mean()
+        for b in range(10) if (bins == b).any()
+    )
+    return {
+        "queries": len(queries),
+        "accuracy": round(float(correct.mean()), 3),
+        "expected_calibration_error": round(float(ece), 3),
+        "temperature": calibrated.temperature,
+        "keyword_accuracy": round(sum(keyword_topic(q) == t for q, t in zip(queries, topics)) / len(queries), 3)
+    }
+
+def train_default_classifier(temperature: float = CALIBRATED_TEMPERATURE) -> TopicClassifier:
+    """
+    Train on the bundled query set plus the keyword seeds, with a precomputed temperature
+    """
+    queries, topics = load_topic_queries()
+    seed_queries, seed_topics = _seed_examples()
+    classifier = TopicClassifier().fit(queries + seed_queries, topics + seed_topics)
+    classifier.temperature = temperature
+    return classifier
+
+_topic_classifier = None
+_topic_classifier_lock = threading.Lock()
+
+def get_topic_classifier() -> TopicClassifier:
+    """Lazy train the default classifier on first use"""
+    global _topic_classifier
+    
+    if _topic_classifier is None:
+        with _topic_classifier_lock:
+            if _topic_classifier is None:
+                _topic_classifier = train_default_classifier()
+    return _topic_classifier
+
+if __name__ == "__main__":
+    print(evaluate())
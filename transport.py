@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Recorded responses live next to the app unless BINTABOT_FIXTURES points elsewhere
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "transport")
+
+class FixtureMissingError(LookupError):
+    """Raised in replay mode for a request that was never recorded"""
+
+class InjectedError(ConnectionError):
+    """Failure injected by the replay transport"""
+
+def request_key(source: str, request: Dict) -> str:
+    """Stable fingerprint of an outbound request"""
+    payload = json.dumps({"source": source, "request": request}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class LiveTransport:
+    """
+    Sends every request to the real source
+    """
+
+    def call(self, source: str, request: Dict, live: Callable[[], Any]) -> Any:
+        return live()
+
+class RecordingTransport(LiveTransport):
+    """
+    Sends requests to the real source and saves each response, with its latency, as a fixture file
+    """
+
+    def __init__(self, fixture_dir: str = FIXTURE_DIR):
+        self.fixture_dir = fixture_dir
+
+    def call(self, source: str, request: Dict, live: Callable[[], Any]) -> Any:
+        start = time.monotonic()
+        response = live()
+        elapsed = time.monotonic() - start
+
+        path = os.path.join(self.fixture_dir, source, f"{request_key(source, request)}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"request": request, "response": response, "latency": round(elapsed, 4)}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return response
+
+class ReplayTransport(LiveTransport):
+    """
+    Serves recorded responses without touching the network. Latency is the recorded one times
+    latency_scale, or a fixed latency if given; error_rate of the calls fail with InjectedError.
+    """
+
+    def __init__(self, fixture_dir: str = FIXTURE_DIR, latency: Optional[float] = None,
+                 latency_scale: float = 1.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self._fixtures = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _load(self, source: str, key: str) -> Dict:
+        """Read a fixture once and keep it in memory"""
+        with self._lock:
+            fixture = self._fixtures.get(key)
+        if fixture is None:
+            path = os.path.join(self.fixture_dir, source, f"{key}.json")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    fixture = json.load(f)
+            except FileNotFoundError:
+                raise FixtureMissingError(f"No recorded {source} response for this request ({key})")
+            with self._lock:
+                self._fixtures[key] = fixture
+        return fixture
+
+    def call(self, source: str, request: Dict, live: Callable[[], Any]) -> Any:
+        fixture = self._load(source, request_key(source, request))
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+        latency = self.latency if self.latency is not None else fixture.get("latency", 0) * self.latency_scale
+        if latency > 0:
+            time.sleep(latency)
+        if fail:
+            raise InjectedError(f"Injected {source} failure")
+        return fixture["response"]
+
+def transport_from_env() -> LiveTransport:
+    """
+    Pick the transport from BINTABOT_TRANSPORT (live, record or replay). Replay honours
+    BINTABOT_REPLAY_LATENCY (seconds), BINTABOT_REPLAY_LATENCY_SCALE and BINTABOT_REPLAY_ERROR_RATE.
+    """
+    mode = os.environ.get("BINTABOT_TRANSPORT", "live").lower()
+    fixture_dir = os.environ.get("BINTABOT_FIXTURES", FIXTURE_DIR)
+    if mode == "record":
+        return RecordingTransport(fixture_dir)
+    if mode == "replay":
+        latency = os.environ.get("BINTABOT_REPLAY_LATENCY")
+        return ReplayTransport(
+            fixture_dir,
+            latency=float(latency) if latency else None,
+            latency_scale=float(os.environ.get("BINTABOT_REPLAY_LATENCY_SCALE", "1.0")),
+            error_rate=float(os.environ.get("BINTABOT_REPLAY_ERROR_RATE", "0.0"))
+        )
+    return LiveTransport()
+
+# Global transport instance, replaceable with set_transport
+transport = transport_from_env()
+
+def get_transport() -> LiveTransport:
+    """Transport currently used for outbound requests"""
+    return transport
+
+def set_transport(new_transport: LiveTransport):
+    """Switch every outbound request to another transport, e.g. a ReplayTransport in a benchmark"""
+    global transport
+    transport = new_transport